@@ -0,0 +1,64 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+TOKEN_CACHE_KEY = 'auth_token:{digest}'
+# Поля пользователя, которые хранятся в кэше вместо самого объекта.
+CACHED_USER_FIELDS = (
+    'id', 'is_active', 'is_staff', 'is_superuser', *User.PUBLIC_FIELDS)
+
+
+def get_token_cache_key(key):
+    """Ключ кэша по хэшу токена, чтобы сам токен не попадал в кэш."""
+    return TOKEN_CACHE_KEY.format(
+        digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_user_tokens(user_id):
+    """Сбрасывает закэшированные токены пользователя."""
+    keys = Token.objects.filter(user=user_id).values_list('key', flat=True)
+    cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пользователя.
+    В кэше по хэшу токена хранятся только id и несекретные поля
+    пользователя, без токена и хэша пароля; остальные поля
+    загружаются из базы при первом обращении. При попадании в кэш
+    запрос не обращается к базе. Кэш сбрасывается при выходе, смене
+    пароля и изменении пользователя, а в остальных случаях живет
+    AUTH_TOKEN_CACHE_TIMEOUT секунд, нулевое значение его отключает.
+    Сброс виден всем процессам только в общем кэше, например Redis
+    или Memcached: с LocMemCache токен, удаленный при выходе в одном
+    воркере, действует в других до истечения таймаута.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, {
+                field: getattr(user, field) for field in CACHED_USER_FIELDS
+            }, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+        # from_db ожидает значения в порядке полей модели, остальные
+        # поля остаются отложенными.
+        field_names = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in cached]
+        db = router.db_for_read(User)
+        user = User.from_db(
+            db, field_names, [cached[name] for name in field_names])
+        token = Token.from_db(db, ('key', 'user_id'), (key, user.pk))
+        token.user = user
+        return user, token
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import DatabaseError, connections
+
+
+def get_connection_warnings(alias, database):
+    """Предупреждения о настройках соединений одной базы."""
+    warnings = []
+    conn_max_age = database.get('CONN_MAX_AGE', 0)
+    if conn_max_age == 0 and 'sqlite' not in database['ENGINE']:
+        warnings.append(Warning(
+            f'Для базы {alias} не задан DB_CONN_MAX_AGE: каждый '
+            f'запрос открывает новое соединение.',
+            hint='Задайте DB_CONN_MAX_AGE, например 60.',
+            id='api.W001'))
+    if conn_max_age is None and not database.get('CONN_HEALTH_CHECKS'):
+        warnings.append(Warning(
+            f'Соединения с базой {alias} не ограничены по времени, '
+            f'но проверка перед использованием отключена.',
+            hint='Включите DB_CONN_HEALTH_CHECKS.',
+            id='api.W002'))
+    return warnings
+
+
+@register()
+def check_connection_settings(app_configs, **kwargs):
+    """Проверяет настройки постоянных соединений с базой."""
+    warnings = []
+    for alias, database in settings.DATABASES.items():
+        warnings.extend(get_connection_warnings(alias, database))
+    return warnings
+
+
+@register(Tags.database)
+def check_database_available(app_configs, databases=None, **kwargs):
+    """
+    Проверяет, что база принимает соединения.
+    Запускается командой check --database при старте контейнера.
+    """
+    errors = []
+    for alias in databases or ():
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError as err:
+            errors.append(Error(
+                f'Не удалось подключиться к базе {alias}: {err}',
+                id='api.E001'))
+    return errors
@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Запросы к базе и время сериализации одного запроса к API."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints = Counter()
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            # SQL до подстановки параметров служит отпечатком запроса.
+            self.fingerprints[sql] += 1
+
+    def get_duplicates(self):
+        """Отпечатки запросов, выполненных больше одного раза."""
+        return [
+            (sql, count) for sql, count in self.fingerprints.most_common()
+            if count > 1]
+
+
+@contextmanager
+def measure_serializer():
+    """
+    Добавляет время сериализации к метрикам текущего запроса.
+    Учитывается только внешний сериализатор, вложенные не суммируются
+    повторно.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or metrics.depth:
+        yield
+        return
+    metrics.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        metrics.depth -= 1
+
+
+class TimedSerializerMixin:
+    """Замеряет время to_representation для инструментирования API."""
+
+    def to_representation(self, instance):
+        with measure_serializer():
+            return super().to_representation(instance)
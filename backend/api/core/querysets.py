@@ -0,0 +1,22 @@
+from django.db.models import Prefetch
+
+from contents.models import Recipe, IngredientRecipe
+
+
+def get_recipe_prefetches():
+    """Связанные объекты рецепта, которые загружаются отдельными запросами."""
+    ingredients = IngredientRecipe.objects.select_related('ingredient')
+    return (
+        Prefetch('ingredient_recipe_set', queryset=ingredients),
+        'tags',
+    )
+
+
+def get_recipes_queryset():
+    """
+    Собирает queryset рецептов для списка и детального просмотра.
+    Все связанные объекты загружаются фиксированным числом запросов,
+    независимо от размера страницы.
+    """
+    return Recipe.objects.select_related('author').prefetch_related(
+        *get_recipe_prefetches()).order_by('-pub_date', '-id')
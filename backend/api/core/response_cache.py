@@ -0,0 +1,82 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'response_cache:generation'
+RESPONSE_KEY = 'response_cache:{generation}:{digest}'
+HITS_KEY = 'response_cache:hits'
+MISSES_KEY = 'response_cache:misses'
+
+
+def get_generation():
+    """Возвращает текущее поколение кэша ответов."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """
+    Делает недействительными все закэшированные ответы.
+    Старые записи не удаляются, а перестают находиться по ключу
+    и вытесняются кэшем по таймауту.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 2, None)
+
+
+def bump_generation_on_commit():
+    """Сбрасывает кэш ответов после фиксации текущей транзакции."""
+    transaction.on_commit(bump_generation)
+
+
+def get_response_key(request):
+    """
+    Ключ ответа по хосту, пути и нормализованным параметрам запроса.
+    Порядок параметров и повторяющихся значений не влияет на ключ.
+    """
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists())
+    digest = hashlib.md5(repr(
+        (request.get_host(), request.path, params)).encode()).hexdigest()
+    return RESPONSE_KEY.format(generation=get_generation(), digest=digest)
+
+
+def increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_cached_data(key):
+    """Возвращает данные ответа из кэша и учитывает попадание или промах."""
+    data = cache.get(key)
+    increment(MISSES_KEY if data is None else HITS_KEY)
+    logger.debug('response cache %s: %s', 'miss' if data is None else 'hit',
+                 key)
+    return data
+
+
+def set_cached_data(key, data):
+    cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def get_stats():
+    """Число попаданий и промахов кэша ответов."""
+    stats = cache.get_many((HITS_KEY, MISSES_KEY))
+    return {
+        'hits': stats.get(HITS_KEY, 0),
+        'misses': stats.get(MISSES_KEY, 0),
+    }
@@ -0,0 +1,108 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from contents.models import Ingredient
+
+PREFIX_MATCH = 0
+SUBSTRING_MATCH = 1
+TRIGRAM_MATCH = 2
+
+
+def search_ingredients(queryset, term, limit=None):
+    """
+    Ищет ингредиенты по названию.
+    Сначала идут совпадения по началу названия, затем по подстроке,
+    а в PostgreSQL еще и похожие по триграммам названия.
+    """
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    term = term.strip()
+    match = Case(
+        When(name__istartswith=term, then=Value(PREFIX_MATCH)),
+        When(name__icontains=term, then=Value(SUBSTRING_MATCH)),
+        default=Value(TRIGRAM_MATCH),
+        output_field=IntegerField())
+    condition = Q(name__icontains=term)
+    order = ['match', 'name']
+    if connection.vendor == 'postgresql':
+        queryset = queryset.annotate(
+            similarity=TrigramSimilarity('name', term))
+        condition |= Q(name__trigram_similar=term)
+        order.insert(1, '-similarity')
+    return queryset.annotate(match=match).filter(
+        condition).order_by(*order)[:limit]
+
+
+class IngredientIndex:
+    """
+    Справочник ингредиентов в памяти процесса.
+    Названия хранятся в отсортированном массиве: поиск по началу
+    названия идет бинарным поиском, по подстроке - простым перебором.
+    Индекс строится при первом обращении, сбрасывается сигналами
+    при изменении ингредиентов и перестраивается по истечении
+    INGREDIENT_INDEX_TTL, чтобы подхватить изменения из других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        """Сбрасывает индекс, он будет построен при следующем поиске."""
+        self._state = None
+
+    def _build(self):
+        items = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda item: (item['name'].casefold(), item['id']))
+        keys = [item['name'].casefold() for item in items]
+        return keys, items, time.monotonic()
+
+    def _load(self):
+        state = self._state
+        if (
+            state is None
+            or time.monotonic() - state[2] > settings.INGREDIENT_INDEX_TTL
+        ):
+            with self._lock:
+                state = self._state
+                if (
+                    state is None
+                    or time.monotonic() - state[2]
+                    > settings.INGREDIENT_INDEX_TTL
+                ):
+                    state = self._build()
+                    self._state = state
+        return state[0], state[1]
+
+    def search(self, term, limit=None):
+        """
+        Возвращает ингредиенты, название которых начинается с term,
+        а за ними - содержащие term, не больше limit штук.
+        """
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        keys, items = self._load()
+        term = term.strip().casefold()
+        result = []
+        position = bisect_left(keys, term)
+        while (
+            position < len(keys) and len(result) < limit
+            and keys[position].startswith(term)
+        ):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if term in key and not key.startswith(term):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import suppress
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from contents.models import IngredientRecipe
+
+SHOPPING_LIST_FILENAME = 'shopping_list'
+PDF_FONT_NAME = 'DejaVuSans'
+PDF_FONT_PATH = os.path.join(
+    os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf')
+PDF_FONT_SIZE = 12
+PDF_HEADER_FONT_SIZE = 14
+PDF_LEADING = 1.5
+PDF_MARGIN = 20 * mm
+
+
+def get_shopping_list(user):
+    """
+    Возвращает список покупок пользователя одним агрегирующим запросом.
+    Ингредиенты группируются по названию и единицам измерения, поэтому
+    одноименные продукты с разными единицами не смешиваются.
+    """
+    return list(IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit')
+    ).annotate(
+        amount=Sum('ingredient_amount')
+    ).order_by('name', 'measurement_unit'))
+
+
+def render_shopping_list_txt(user, shopping_list):
+    """Построчно формирует список покупок в формате .txt."""
+    header = f'Список покупок для пользователя {user.username}\n\n'
+    yield header.upper().encode()
+    for count, item in enumerate(shopping_list, start=1):
+        yield (f'{count}. {item["name"]} - {item["amount"]} '
+               f'({item["measurement_unit"]})\n\n').encode()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, PDF_FONT_PATH))
+    return PDF_FONT_NAME
+
+
+def render_shopping_list_pdf(user, shopping_list):
+    """
+    Формирует список покупок в формате .pdf в памяти.
+    Длинные строки переносятся, при заполнении листа начинается новый.
+    """
+    font = get_pdf_font()
+    buffer = BytesIO()
+    canvas = Canvas(buffer, pagesize=A4, invariant=True)
+    canvas.setTitle(SHOPPING_LIST_FILENAME)
+    width, height = A4
+    text_width = width - 2 * PDF_MARGIN
+    y = height - PDF_MARGIN
+
+    def draw_line(text, font_size=PDF_FONT_SIZE):
+        nonlocal y
+        for line in simpleSplit(text, font, font_size, text_width):
+            if y < PDF_MARGIN:
+                canvas.showPage()
+                y = height - PDF_MARGIN
+            canvas.setFont(font, font_size)
+            canvas.drawString(PDF_MARGIN, y, line)
+            y -= font_size * PDF_LEADING
+
+    header = f'Список покупок для пользователя {user.username}'
+    draw_line(header.upper(), PDF_HEADER_FONT_SIZE)
+    y -= PDF_FONT_SIZE
+    for count, item in enumerate(shopping_list, start=1):
+        draw_line(f'{count}. {item["name"]} - {item["amount"]} '
+                  f'({item["measurement_unit"]})')
+    canvas.save()
+    yield buffer.getvalue()
+
+
+RENDERERS = {
+    'txt': (render_shopping_list_txt, 'text/plain; charset=utf-8'),
+    'pdf': (render_shopping_list_pdf, 'application/pdf'),
+}
+
+
+def get_cache_key(user, shopping_list, extension):
+    """Хэш содержимого списка покупок для имени файла в кэше."""
+    payload = json.dumps(
+        [extension, user.username, shopping_list],
+        ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def evict_cached_files(cache_dir, max_size, max_age, keep=None):
+    """
+    Удаляет из кэша устаревшие файлы, а затем самые старые файлы,
+    пока суммарный размер кэша не станет меньше max_size.
+    Файл keep не удаляется.
+    """
+    now = time.time()
+    files = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.path == keep:
+                continue
+            with suppress(FileNotFoundError):
+                stat = entry.stat()
+                if now - stat.st_mtime > max_age:
+                    os.remove(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in files)
+    if keep is not None:
+        total_size += os.path.getsize(keep)
+    for _, size, path in sorted(files):
+        if total_size <= max_size:
+            break
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        total_size -= size
+
+
+def get_cached_file(user, shopping_list, extension):
+    """
+    Возвращает путь к файлу списка покупок из кэша на диске.
+    Если актуального файла нет, формирует его и чистит кэш.
+    """
+    cache_dir = settings.SHOPPING_LIST_CACHE_DIR
+    max_age = settings.SHOPPING_LIST_CACHE_MAX_AGE
+    key = get_cache_key(user, shopping_list, extension)
+    path = os.path.join(cache_dir, f'{key}.{extension}')
+    try:
+        if time.time() - os.path.getmtime(path) <= max_age:
+            return path
+    except FileNotFoundError:
+        pass
+    os.makedirs(cache_dir, exist_ok=True)
+    renderer, _ = RENDERERS[extension]
+    descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as file_obj:
+        file_obj.writelines(renderer(user, shopping_list))
+    os.replace(temp_path, path)
+    evict_cached_files(
+        cache_dir, settings.SHOPPING_LIST_CACHE_MAX_SIZE, max_age, keep=path)
+    return path
+
+
+def shopping_list_response(user, shopping_list, extension='txt'):
+    """
+    Отдает список покупок потоком, не сохраняя его на диск.
+    При включенном кэше файл берется из кэша или создается в нем.
+    """
+    renderer, content_type = RENDERERS[extension]
+    filename = f'{SHOPPING_LIST_FILENAME}.{extension}'
+    if settings.SHOPPING_LIST_CACHE_DIR:
+        path = get_cached_file(user, shopping_list, extension)
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=filename,
+            content_type=content_type)
+    response = StreamingHttpResponse(
+        renderer(user, shopping_list), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
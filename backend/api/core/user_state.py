@@ -0,0 +1,78 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+
+from contents.models import Favorites, ShoppingCart, Subscriptions
+
+USER_STATE_KEY = 'user_state:{user_id}'
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+SUBSCRIPTIONS = 'subscriptions'
+STATE_SOURCES = (
+    (FAVORITES, Favorites, 'recipe_id'),
+    (SHOPPING_CART, ShoppingCart, 'recipe_id'),
+    (SUBSCRIPTIONS, Subscriptions, 'author_id'),
+)
+
+
+def get_empty_state():
+    return {kind: set() for kind, _, _ in STATE_SOURCES}
+
+
+def build_user_state(user_id):
+    """
+    Собирает одним запросом id рецептов в избранном и в списке покупок
+    и id авторов, на которых подписан пользователь.
+    """
+    kinds = [kind for kind, _, _ in STATE_SOURCES]
+    querysets = [
+        model.objects.filter(user=user_id).values_list(
+            Value(number, output_field=IntegerField()), field)
+        for number, (_, model, field) in enumerate(STATE_SOURCES)]
+    state = get_empty_state()
+    for number, object_id in querysets[0].union(*querysets[1:], all=True):
+        state[kinds[number]].add(object_id)
+    return state
+
+
+def get_user_state(user):
+    """
+    Возвращает множества id избранного, списка покупок и подписок
+    пользователя из кэша, при промахе строит их заново.
+    """
+    if not user.is_authenticated:
+        return get_empty_state()
+    key = USER_STATE_KEY.format(user_id=user.pk)
+    state = cache.get(key)
+    if state is None:
+        state = build_user_state(user.pk)
+        cache.set(key, state, settings.USER_STATE_CACHE_TIMEOUT)
+    return state
+
+
+def get_context_user_state(context):
+    """
+    Возвращает состояние пользователя из контекста сериализатора.
+    Состояние загружается один раз на весь запрос.
+    """
+    if 'user_state' not in context:
+        context['user_state'] = get_user_state(context['user'])
+    return context['user_state']
+
+
+def get_user_state_version(user):
+    """
+    Версия состояния пользователя: хэш его избранного, списка покупок
+    и подписок. Одинакова во всех процессах и меняется при любом
+    изменении состояния.
+    """
+    state = get_user_state(user)
+    payload = repr([sorted(state[kind]) for kind, _, _ in STATE_SOURCES])
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def invalidate_user_state(user_id):
+    """Сбрасывает кэш состояния пользователя после изменений."""
+    cache.delete(USER_STATE_KEY.format(user_id=user_id))
@@ -1,11 +1,12 @@
 from enum import Enum
 
 import django_filters
-from django.shortcuts import get_object_or_404
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from contents.models import Ingredient, Recipe, Tag
-from users.models import User
-from .core.utils import get_recipes_queryset
+from contents.models import Ingredient, Recipe, Tag, Favorites, ShoppingCart
+from .core.search import search_ingredients
 
 
 class BooleanChoices(Enum):
@@ -29,6 +30,19 @@ class IngredientFilter(django_filters.FilterSet):
         }
 
 
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов по параметру ?name=
+    с ранжированием и ограничением числа результатов.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        if view.action != 'list' or not term.strip():
+            return queryset
+        return search_ingredients(queryset, term)
+
+
 class RecipeFilter(django_filters.FilterSet):
     """Фильтр для рецептов."""
     author = django_filters.NumberFilter(
@@ -52,26 +66,25 @@ class RecipeFilter(django_filters.FilterSet):
         model = Recipe
         fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
 
-    def filter_is_favorited(self, queryset, name, value):
-        """Метод для фильтрации по избранному."""
+    def filter_user_state(self, queryset, model, value):
+        """Оставляет рецепты, которые есть или отсутствуют в model."""
         if self.request is None:
-            return Recipe.objects.none()
-        user = get_object_or_404(
-            User, username=self.request.user.username)
-        favorites = user.favorites.all()
+            return queryset.none()
+        user = self.request.user
+        if not user.is_authenticated:
+            if value == BooleanChoices.TRUE.value:
+                return queryset.none()
+            return queryset
+        in_user_state = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk')))
         if value == BooleanChoices.TRUE.value:
-            return get_recipes_queryset(favorites)
-        if value == BooleanChoices.FALSE.value:
-            return get_recipes_queryset(favorites, exclude=True)
+            return queryset.filter(in_user_state)
+        return queryset.filter(~in_user_state)
+
+    def filter_is_favorited(self, queryset, name, value):
+        """Метод для фильтрации по избранному."""
+        return self.filter_user_state(queryset, Favorites, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Метод для фильтрации по списку покупок."""
-        if self.request is None:
-            return Recipe.objects.none()
-        user = get_object_or_404(
-            User, username=self.request.user.username)
-        shopping_cart = user.shopping_cart.all()
-        if value == BooleanChoices.TRUE.value:
-            return get_recipes_queryset(shopping_cart)
-        if value == BooleanChoices.FALSE.value:
-            return get_recipes_queryset(shopping_cart, exclude=True)
+        return self.filter_user_state(queryset, ShoppingCart, value)
@@ -0,0 +1,127 @@
+import json
+import statistics
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Prefetch
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from contents.models import Recipe, Subscriptions
+from users.models import User
+from api.core.querysets import get_recipes_queryset
+from api.core.user_state import get_user_state
+from api.serializers import (
+    RecipeSerializer, SubscriptionSerializer, UserSerializer)
+
+
+def block_queries(execute, sql, params, many, context):
+    raise CommandError(f'Сериализатор обратился к базе: {sql}')
+
+
+class Command(BaseCommand):
+    """
+    Замеряет скорость сериализации страниц рецептов, подписок и
+    пользователей без учета времени базы данных.
+    Объекты со всеми связанными данными загружаются заранее, а во
+    время замеров любой запрос к базе прерывает команду, поэтому
+    результат отражает только работу Python. Для страниц большого
+    размера заполните базу командой seed_foodgram.
+    """
+    help = 'Замеряет скорость сериализаторов без учета запросов к базе.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=(6, 50, 500),
+            help='Размеры страниц.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Число повторов замера, берется медиана.')
+        parser.add_argument(
+            '--recipes-limit', type=int, default=3,
+            help='Число рецептов автора в ленте подписок.')
+        parser.add_argument(
+            '--output', help='Файл для отчета в формате JSON.')
+
+    def get_context(self, user):
+        hosts = [
+            host for host in settings.ALLOWED_HOSTS
+            if not host.startswith(('.', '*'))]
+        request = Request(APIRequestFactory().get(
+            '/api/', HTTP_HOST=hosts[0] if hosts else 'localhost'))
+        request.user = user
+        return {
+            'request': request,
+            'user': user,
+            'user_state': get_user_state(user),
+            'recipes_limit': self.options['recipes_limit'],
+        }
+
+    def get_benchmarks(self, size):
+        """Страницы объектов в том виде, в каком их загружают вьюхи."""
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = self.options['recipes_limit']
+        subscriptions = Subscriptions.objects.select_related(
+            'author').prefetch_related(
+            Prefetch('author__recipes',
+                     queryset=recipes[:recipes_limit],
+                     to_attr='feed_recipes')).order_by('id')
+        return {
+            'RecipeSerializer': (
+                RecipeSerializer, list(get_recipes_queryset()[:size])),
+            'SubscriptionSerializer': (
+                SubscriptionSerializer, list(subscriptions[:size])),
+            'UserSerializer': (
+                UserSerializer, list(User.objects.order_by('id')[:size])),
+        }
+
+    def measure(self, serializer_class, objects, context):
+        def serialize():
+            return serializer_class(objects, many=True, context=context).data
+
+        timer = timeit.Timer(serialize)
+        number, _ = timer.autorange()
+        with connections['default'].execute_wrapper(block_queries):
+            timings = timer.repeat(repeat=self.options['repeat'],
+                                   number=number)
+        return statistics.median(timings) / number
+
+    def handle(self, *args, **options):
+        self.options = options
+        user = User.objects.filter(
+            subscriptions__isnull=False).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Недостаточно данных: запустите seed_foodgram.')
+        context = self.get_context(user)
+        report = []
+        for size in options['sizes']:
+            for name, (serializer_class, objects) in self.get_benchmarks(
+                    size).items():
+                if len(objects) < size:
+                    self.stderr.write(
+                        f'{name}: в базе только {len(objects)} объектов, '
+                        f'страница {size} пропущена.')
+                    continue
+                elapsed = self.measure(serializer_class, objects, context)
+                result = {
+                    'serializer': name,
+                    'page_size': size,
+                    'page_ms': round(elapsed * 1000, 3),
+                    'object_us': round(elapsed / size * 1e6, 1),
+                    'objects_per_second': round(size / elapsed),
+                }
+                report.append(result)
+                self.stdout.write(
+                    f'{name:<24} {size:>5} шт.: '
+                    f'{result["page_ms"]:>9.3f} мс на страницу, '
+                    f'{result["object_us"]:>7.1f} мкс на объект, '
+                    f'{result["objects_per_second"]:>8} объектов/с')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Отчет записан в {options["output"]}.'))
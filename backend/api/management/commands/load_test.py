@@ -0,0 +1,230 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from contents.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class Journey:
+    """
+    Сценарии пользователей, повторяющие запросы фронтенда.
+    Каждый шаг - пара из имени конечной точки для отчета и адреса.
+    Анонимам доступны только сценарии без авторизации.
+    """
+
+    def __init__(self, rng, authenticated, recipe_ids, tag_slugs,
+                 search_terms):
+        self.rng = rng
+        self.authenticated = authenticated
+        self.recipe_ids = recipe_ids
+        self.tag_slugs = tag_slugs
+        self.search_terms = search_terms
+
+    def browse(self):
+        """Главная страница, листание ленты и просмотр рецепта."""
+        yield 'tags', '/api/tags/'
+        yield 'recipes', '/api/recipes/?page=1&limit=6'
+        yield 'recipes', (
+            f'/api/recipes/?page={self.rng.randint(2, 10)}&limit=6')
+        yield 'recipe detail', (
+            f'/api/recipes/{self.rng.choice(self.recipe_ids)}/')
+
+    def filter_feed(self):
+        """Лента с тэгами и избранным."""
+        tags = '&'.join(
+            f'tags={slug}' for slug in self.rng.sample(
+                self.tag_slugs, min(2, len(self.tag_slugs))))
+        yield 'recipes filtered', f'/api/recipes/?page=1&limit=6&{tags}'
+        if self.authenticated:
+            yield 'recipes favorited', (
+                '/api/recipes/?page=1&limit=6&is_favorited=1')
+
+    def subscriptions(self):
+        """Страница подписок."""
+        yield 'subscriptions', (
+            '/api/users/subscriptions/?page=1&limit=6&recipes_limit=3')
+
+    def search_ingredients(self):
+        """Ввод названия ингредиента при создании рецепта."""
+        term = self.rng.choice(self.search_terms)
+        for length in range(1, len(term) + 1):
+            yield 'ingredients search', (
+                f'/api/ingredients/?name={term[:length]}')
+
+    def shopping_cart(self):
+        """Список покупок и его скачивание."""
+        yield 'recipes in cart', (
+            '/api/recipes/?page=1&limit=6&is_in_shopping_cart=1')
+        yield 'download shopping cart', (
+            '/api/recipes/download_shopping_cart/')
+
+    def choose(self):
+        journeys = [(self.browse, 5), (self.filter_feed, 2)]
+        if self.authenticated:
+            journeys += [
+                (self.subscriptions, 2),
+                (self.search_ingredients, 2),
+                (self.shopping_cart, 1),
+            ]
+        journey, = self.rng.choices(
+            [journey for journey, _ in journeys],
+            weights=[weight for _, weight in journeys])
+        return journey()
+
+
+def percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(
+        values, n=100, method='inclusive')[percent - 1]
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест API запущенного сервера.
+    Каждый виртуальный пользователь проходит сценарии фронтенда со
+    своим токеном и отдельной сессией. Результат - отчет JSON с
+    числом запросов в секунду и задержками p50, p95 и p99 по каждой
+    конечной точке, который удобно сравнивать между коммитами.
+    Токены и id рецептов берутся из той же базы, что и у сервера,
+    поэтому команду запускают с теми же настройками.
+    """
+    help = 'Нагрузочный тест API с отчетом в формате JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000',
+            help='Адрес запущенного сервера.')
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Число одновременных виртуальных пользователей.')
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность теста в секундах.')
+        parser.add_argument(
+            '--warmup', type=float, default=3,
+            help='Прогрев в секундах, не попадает в отчет.')
+        parser.add_argument(
+            '--anonymous', type=float, default=0.2,
+            help='Доля анонимных пользователей.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--output', help='Файл для отчета, по умолчанию stdout.')
+
+    def get_fixtures(self, count):
+        recipe_ids = list(Recipe.objects.order_by(
+            '-pub_date').values_list('id', flat=True)[:500])
+        tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        names = list(Ingredient.objects.order_by('id').values_list(
+            'name', flat=True)[:1000])
+        rng = random.Random(self.options['seed'])
+        search_terms = [
+            name[:4].lower()
+            for name in rng.sample(names, min(50, len(names)))]
+        if not (recipe_ids and tag_slugs and search_terms):
+            raise CommandError(
+                'Недостаточно данных: запустите seed_foodgram.')
+        users = list(User.objects.filter(
+            subscriptions__isnull=False).distinct().order_by('id')[:count])
+        tokens = [
+            Token.objects.get_or_create(user=user)[0].key for user in users]
+        return recipe_ids, tag_slugs, search_terms, tokens
+
+    def worker(self, number, token, fixtures, deadline, record):
+        rng = random.Random(self.options['seed'] + number)
+        journey = Journey(rng, token is not None, *fixtures)
+        session = requests.Session()
+        if token is not None:
+            session.headers['Authorization'] = f'Token {token}'
+        while time.monotonic() < deadline:
+            for name, path in journey.choose():
+                start = time.perf_counter()
+                try:
+                    response = session.get(self.base_url + path, timeout=30)
+                    ok = response.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                record(name, time.perf_counter() - start, ok)
+                if time.monotonic() >= deadline:
+                    break
+
+    def run(self, fixtures, tokens, duration):
+        results = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def record(name, elapsed, ok):
+            with lock:
+                results[name].append(elapsed * 1000)
+                if not ok:
+                    errors[name] += 1
+
+        deadline = time.monotonic() + duration
+        with ThreadPoolExecutor(max_workers=len(tokens)) as executor:
+            futures = [
+                executor.submit(
+                    self.worker, number, token, fixtures, deadline, record)
+                for number, token in enumerate(tokens)]
+            for future in futures:
+                future.result()
+        return results, errors
+
+    def get_stats(self, latencies, errors, duration):
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': round(len(latencies) / duration, 1),
+            'mean_ms': round(statistics.mean(latencies), 1),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1),
+        }
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.base_url = options['base_url'].rstrip('/')
+        users = options['users']
+        anonymous = round(users * options['anonymous'])
+        *fixtures, tokens = self.get_fixtures(users - anonymous)
+        tokens = tokens + [None] * (users - len(tokens))
+        if options['warmup']:
+            self.run(fixtures, tokens, options['warmup'])
+        duration = options['duration']
+        results, errors = self.run(fixtures, tokens, duration)
+        if not results:
+            raise CommandError('Не выполнено ни одного запроса.')
+        report = {
+            'config': {
+                'base_url': self.base_url,
+                'users': users,
+                'anonymous_users': tokens.count(None),
+                'duration': duration,
+                'seed': options['seed'],
+            },
+            'endpoints': {
+                name: self.get_stats(latencies, errors[name], duration)
+                for name, latencies in sorted(results.items())},
+            'total': self.get_stats(
+                [value for values in results.values() for value in values],
+                sum(errors.values()), duration),
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'Отчет записан в {options["output"]}: '
+                f'{report["total"]["rps"]} запросов/с, '
+                f'p95 {report["total"]["p95_ms"]} мс.'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.core.response_cache import bump_generation, get_stats
+
+
+class Command(BaseCommand):
+    """
+    Выводит число попаданий и промахов кэша ответов для анонимов.
+    С флагом --clear сбрасывает закэшированные ответы.
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Сбросить кэш ответов сменой поколения.')
+
+    def handle(self, *args, **kwargs):
+        stats = get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {ratio:.1%}')
+        if kwargs['clear']:
+            bump_generation()
+            self.stdout.write(self.style.SUCCESS('Кэш ответов сброшен!'))
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .core.instrumentation import RequestMetrics, current_metrics
+
+logger = logging.getLogger('api.instrumentation')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов, чем позволяет бюджет."""
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Считает запросы к базе, время SQL и сериализации для каждого
+    представления и действия вьюсета.
+    Метрики отдаются в заголовке Server-Timing и пишутся в лог одной
+    строкой JSON. Бюджеты запросов задаются в QUERY_BUDGETS по имени
+    вида RecipeViewSet.list; при QUERY_BUDGET_RAISE превышение
+    бюджета вызывает исключение, что удобно в тестах.
+    Включается настройкой QUERY_INSTRUMENTATION_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total_time = time.perf_counter() - start
+        endpoint = getattr(request, 'endpoint', None)
+        if endpoint is None:
+            return response
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ))
+        duplicates = metrics.get_duplicates()
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'serializer_ms': round(metrics.serializer_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            'duplicates': [
+                {'fingerprint': hashlib.md5(sql.encode()).hexdigest()[:8],
+                 'count': count, 'sql': sql[:200]}
+                for sql, count in duplicates],
+        }, ensure_ascii=False))
+        self.check_budget(endpoint, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Определяет имя представления и действия вьюсета."""
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return None
+        action = getattr(view_func, 'actions', {}).get(
+            request.method.lower(), request.method.lower())
+        request.endpoint = f'{view_class.__name__}.{action}'
+        return None
+
+    def check_budget(self, endpoint, metrics):
+        budget = settings.QUERY_BUDGETS.get(endpoint)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = (f'{endpoint}: выполнено запросов {metrics.queries}, '
+                   f'бюджет {budget}.')
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -1,6 +1,172 @@
+import base64
+import binascii
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .core import response_cache
+from .core.user_state import get_user_state_version
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     """Пагинатор с возможностью ограничения размера страницы."""
     page_size_query_param = 'limit'
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который дешево считает общее число объектов.
+    COUNT выполняется по queryset без сортировки и связанных объектов
+    и кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT секунд для каждого
+    набора фильтров и версии count_version. Для таблицы без фильтров
+    в PostgreSQL берется оценка reltuples, если она больше
+    PAGINATION_ESTIMATE_THRESHOLD.
+    """
+
+    def __init__(self, *args, count_version=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_version = count_version
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        queryset = self.object_list.order_by().select_related(
+            None).prefetch_related(None)
+        sql, params = queryset.query.sql_with_params()
+        key = 'pagination_count:' + hashlib.md5(
+            repr((sql, params, self.count_version)).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.get_estimate(queryset)
+            if count is None:
+                count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_estimate(self, queryset):
+        """Оценка числа строк из статистики PostgreSQL для всей таблицы."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.PAGINATION_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+
+class CachedCountPagination(LimitPageNumberPagination):
+    """Пагинатор с ограничением размера страницы и дешевым подсчетом."""
+    # Фильтры, результат которых зависит от состояния пользователя.
+    user_state_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_version = self.get_count_version(request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, queryset, page_size):
+        return CachedCountPaginator(
+            queryset, page_size, count_version=self.count_version)
+
+    def get_count_version(self, request):
+        """
+        Версия закэшированного COUNT. Поколение кэша ответов меняется
+        при записи рецептов, а для фильтров по избранному и списку
+        покупок учитывается и версия состояния пользователя.
+        """
+        version = [response_cache.get_generation()]
+        if any(param in request.query_params
+               for param in self.user_state_params):
+            version.append(get_user_state_version(request.user))
+        return version
+
+    def get_page_state(self):
+        """Общее число объектов, от которого зависят ссылки на страницы."""
+        return self.page.paginator.count
+
+
+class RecipeFeedPagination(CachedCountPagination):
+    """
+    Пагинатор ленты рецептов.
+    По умолчанию работает постранично через limit и page. Если передан
+    параметр cursor, переключается на пагинацию по ключу (pub_date, id):
+    страница выбирается условием WHERE без OFFSET и без подсчета COUNT,
+    поэтому дальние страницы отдаются так же быстро, как первая.
+    Для первой страницы достаточно передать пустой cursor.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.has_next = len(results) > page_size
+        return self.page
+
+    def decode_cursor(self, cursor):
+        """Возвращает (pub_date, id) последнего рецепта прошлой страницы."""
+        if not cursor:
+            return None
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            pub_date, pk = value.rsplit('|', 1)
+            position = parse_datetime(pub_date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, recipe):
+        value = f'{recipe.pub_date.isoformat()}|{recipe.pk}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.page[-1]))
+
+    def get_page_state(self):
+        if not self.use_cursor:
+            return super().get_page_state()
+        return self.has_next
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
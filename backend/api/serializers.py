@@ -2,22 +2,26 @@ import re
 import base64
 import uuid
 
-from django.shortcuts import get_object_or_404
 from django.contrib.auth import password_validation
 from django.core.files.base import ContentFile
 from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from users.models import User
 from contents.models import (
     Tag, Ingredient, Recipe, IngredientRecipe, Favorites,
     Subscriptions, ShoppingCart)
+from .core.instrumentation import TimedSerializerMixin
+from .core.user_state import (
+    FAVORITES, SHOPPING_CART, SUBSCRIPTIONS, get_context_user_state)
 from .core.utils import (
-    get_tag_and_create_related, get_ingredient_and_create_related,
-    filter_ingredients_and_create_related, filter_tags_and_create_related)
+    check_objects_exist, create_related_tags, create_related_ingredients,
+    update_related_ingredients, update_related_tags)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для регистрации и получения информации о пользователе."""
     is_subscribed = serializers.SerializerMethodField(default=False)
 
@@ -54,13 +58,8 @@ class UserSerializer(serializers.ModelSerializer):
         return make_password(value)
 
     def get_is_subscribed(self, obj):
-        if hasattr(obj, 'is_subscribed'):
-            return bool(obj.is_subscribed)
-        request_user = self.context['user']
-        if request_user.is_authenticated:
-            user = get_object_or_404(
-                User, username=request_user.get_username())
-            return user.subscriptions.filter(author=obj).exists()
+        user_state = get_context_user_state(self.context)
+        return obj.id in user_state[SUBSCRIPTIONS]
 
 
 class SetPasswordSerializer(serializers.Serializer):
@@ -96,7 +95,7 @@ class SetPasswordSerializer(serializers.Serializer):
         return user
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для тэгов."""
     class Meta:
         model = Tag
@@ -109,7 +108,8 @@ class TagSerializer(serializers.ModelSerializer):
         return data
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для игредиентов."""
     class Meta:
         model = Ingredient
@@ -122,7 +122,8 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='ingredient.name', read_only=True)
     measurement_unit = serializers.CharField(
         source='ingredient.measurement_unit', read_only=True)
-    amount = serializers.IntegerField(source='ingredient_amount')
+    amount = serializers.IntegerField(
+        source='ingredient_amount', min_value=1)
 
     class Meta:
         model = IngredientRecipe
@@ -142,7 +143,7 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(value)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для рецептов с дополнительными полями."""
     author = UserSerializer(
         read_only=True,
@@ -162,12 +163,18 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time', 'is_favorited', 'is_in_shopping_cart')
 
     def validate(self, data):
-        if not self.initial_data.get('ingredients'):
+        ingredients = self.initial_data.get('ingredients')
+        tags = self.initial_data.get('tags')
+        if not ingredients:
             raise serializers.ValidationError(
                 {'Ingredients': 'Рецепт не может быть без ингредиентов.'})
-        if not self.initial_data.get('tags'):
+        if not tags:
             raise serializers.ValidationError(
                 {'Tags': 'Добавь тэги для рецепта.'})
+        check_objects_exist(
+            Ingredient, [item.get('id') for item in ingredients],
+            'Ingredients')
+        check_objects_exist(Tag, tags, 'Tags')
         return data
 
     def validate_cooking_time(self, value):
@@ -178,43 +185,35 @@ class RecipeSerializer(serializers.ModelSerializer):
         return value
 
     def get_is_favorited(self, obj):
-        if hasattr(obj, 'is_favorited'):
-            return bool(obj.is_favorited)
-        user = self.context['user']
-        if user.is_authenticated:
-            user = get_object_or_404(
-                User, username=user.username)
-            return obj.favorites.filter(user=user).exists()
+        user_state = get_context_user_state(self.context)
+        return obj.id in user_state[FAVORITES]
 
     def get_is_in_shopping_cart(self, obj):
-        if hasattr(obj, 'is_in_shopping_cart'):
-            return bool(obj.is_in_shopping_cart)
-        user = self.context['user']
-        if user.is_authenticated:
-            user = get_object_or_404(
-                User, username=user.username)
-            return obj.shopping_cart.filter(user=user).exists()
+        user_state = get_context_user_state(self.context)
+        return obj.id in user_state[SHOPPING_CART]
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = self.initial_data.get('ingredients')
         validated_data.pop('ingredient_recipe_set')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        get_ingredient_and_create_related(ingredients, recipe)
-        get_tag_and_create_related(tags, recipe)
+        create_related_ingredients(ingredients, recipe)
+        create_related_tags(tags, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = self.initial_data.get('ingredients')
         validated_data.pop('ingredient_recipe_set')
         tags = validated_data.pop('tags')
         super().update(instance, validated_data)
-        filter_ingredients_and_create_related(instance, ingredients)
-        filter_tags_and_create_related(instance, tags)
+        update_related_ingredients(instance, ingredients)
+        update_related_tags(instance, tags)
         return instance
 
 
-class RelatedRecipeSerializer(serializers.Serializer):
+class RelatedRecipeSerializer(TimedSerializerMixin, serializers.Serializer):
     """
     Поля для отображения рецептов в сериализаторах
     Избранного и Списка покупок.
@@ -235,8 +234,27 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteSerializer(RelatedRecipeSerializer, serializers.ModelSerializer):
+class UniqueCreateMixin:
+    """
+    Превращает нарушение ограничения уникальности при создании в
+    ошибку 400 с тем же текстом, что и проверка в validate. Ошибка
+    возможна, если два одинаковых запроса пришли одновременно.
+    """
+    duplicate_message = None
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]})
+
+
+class FavoriteSerializer(UniqueCreateMixin, RelatedRecipeSerializer,
+                         serializers.ModelSerializer):
     """Сериализатор для добавления рецептов в избранное."""
+    duplicate_message = 'Рецепт уже добавлен в избранное!'
 
     class Meta:
         model = Favorites
@@ -246,14 +264,14 @@ class FavoriteSerializer(RelatedRecipeSerializer, serializers.ModelSerializer):
         user = self.context['user']
         recipe = self.context['recipe']
         if user.favorites.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное!')
+            raise serializers.ValidationError(self.duplicate_message)
         return data
 
 
-class ShoppingCartSerializer(RelatedRecipeSerializer,
+class ShoppingCartSerializer(UniqueCreateMixin, RelatedRecipeSerializer,
                              serializers.ModelSerializer):
     """Сериализатор для добавления рецептов в список покупок."""
+    duplicate_message = 'Рецепт уже добавлен в список покупок!'
 
     class Meta:
         model = ShoppingCart
@@ -263,12 +281,12 @@ class ShoppingCartSerializer(RelatedRecipeSerializer,
         user = self.context['user']
         recipe = self.context['recipe']
         if user.shopping_cart.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в список покупок!')
+            raise serializers.ValidationError(self.duplicate_message)
         return data
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(UniqueCreateMixin, TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор для подписки на пользователя."""
     id = serializers.IntegerField(source='author.id', read_only=True)
     email = serializers.CharField(source='author.email', read_only=True)
@@ -280,6 +298,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(default=False)
     recipes_count = serializers.SerializerMethodField(default=0)
     recipes = serializers.SerializerMethodField()
+    duplicate_message = 'Вы уже подписаны на автора!'
 
     class Meta:
         model = Subscriptions
@@ -292,39 +311,28 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         if user.username == author.username:
             raise serializers.ValidationError('Нельзя подписаться на себя!')
         if user.subscriptions.filter(author=author).exists():
-            raise serializers.ValidationError('Вы уже подписаны на автора!')
+            raise serializers.ValidationError(self.duplicate_message)
         return data
 
     def get_is_subscribed(self, obj):
         """Сообщает, подписан ли пользователь на автора."""
-        if hasattr(obj, 'is_subscribed'):
-            return bool(obj.is_subscribed)
-        request_user = self.context['user']
-        if request_user.is_authenticated:
-            user = get_object_or_404(User, username=request_user.username)
-            return user.subscriptions.filter(author=obj.author).exists()
-        return False
+        user_state = get_context_user_state(self.context)
+        return obj.author_id in user_state[SUBSCRIPTIONS]
 
     def get_recipes_count(self, obj):
-        """Считает количество рецептов в подписках."""
-        if hasattr(obj, 'recipes_count'):
-            return obj.recipes_count
-        return obj.author.recipes.count()
+        """Возвращает количество рецептов автора."""
+        return obj.author.recipes_count
 
     def get_recipes(self, obj):
-        """Возвращает список рецептов автора."""
-        output = []
-        for recipe in obj.author.recipes.all():
-            serializer = ShortRecipeSerializer(recipe, context=self.context)
-            output.append(serializer.data)
-        recipes_limit = self.context['recipes_limit']
-        if recipes_limit:
-            try:
-                if int(recipes_limit) < 0:
-                    raise serializers.ValidationError(
-                        'Укажите целое неотрицательное число.')
-                output = output[:int(recipes_limit)]
-            except ValueError:
-                raise serializers.ValidationError(
-                    'Укажите целое число рецептов.')
-        return output
+        """
+        Возвращает последние рецепты автора. Во вьюхе подписок они уже
+        ограничены recipes_limit на уровне базы данных.
+        """
+        recipes = getattr(obj.author, 'feed_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipes.order_by('-pub_date')
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return ShortRecipeSerializer(
+            recipes, many=True, context=self.context).data
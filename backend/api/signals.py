@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from contents.models import (
+    Ingredient, Favorites, ShoppingCart, Subscriptions, Recipe, Tag)
+from users.models import User
+from .authentication import get_token_cache_key, invalidate_user_tokens
+from .core.response_cache import bump_generation_on_commit
+from .core.search import ingredient_index
+from .core.user_state import invalidate_user_state
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при изменении справочника."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Favorites)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscriptions)
+def invalidate_cached_user_state(instance, **kwargs):
+    """Сбрасывает кэш избранного, покупок и подписок пользователя."""
+    invalidate_user_state(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(post_delete, sender=User)
+def invalidate_response_cache(**kwargs):
+    """
+    Сбрасывает кэш ответов для анонимов при изменении рецептов,
+    тэгов, ингредиентов и авторов. Связи рецепта с тэгами и
+    ингредиентами пишутся в одной транзакции с сохранением рецепта,
+    поэтому поколение меняется после ее фиксации.
+    """
+    bump_generation_on_commit()
+
+
+@receiver(post_save, sender=User)
+def invalidate_response_cache_for_author(instance, created, **kwargs):
+    """
+    Сбрасывает кэш ответов, только если изменились поля автора,
+    которые выводятся в рецептах. Вход пользователя сохраняет
+    last_login и кэш не сбрасывает.
+    """
+    if not created and instance.public_data_changed():
+        bump_generation_on_commit()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Сбрасывает кэш токена при выходе пользователя."""
+    cache.delete(get_token_cache_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_tokens(instance, **kwargs):
+    """
+    Сбрасывает кэш токенов при изменении пользователя, в том числе
+    при смене пароля и блокировке.
+    """
+    invalidate_user_tokens(instance.pk)
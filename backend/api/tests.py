@@ -1,22 +1,45 @@
+import os
 import shutil
 import tempfile
 import base64
+import json
+import time
+from io import StringIO
 from http import HTTPStatus
+from unittest import mock
 
 from django.conf import settings
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.authtoken.models import Token
 
+from contents.core.utils import recount_counters
 from contents.models import (
-    Recipe, Ingredient, Tag, TagRecipe, IngredientRecipe)
+    Recipe, Ingredient, Tag, TagRecipe, IngredientRecipe, Favorites,
+    ShoppingCart, Subscriptions)
+from api.core.shopping_list import (
+    get_shopping_list, get_cached_file, render_shopping_list_pdf)
+from api.core.search import ingredient_index
+from api.core.response_cache import get_generation, get_stats
+from api.authentication import get_token_cache_key
+from api.checks import get_connection_warnings
+from api.middleware import QueryBudgetExceeded
+from api.serializers import (
+    FavoriteSerializer, ShoppingCartSerializer, SubscriptionSerializer)
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEST_IMAGE = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAUAAAAFCAYAAACNbyblAAAAHElEQVQI12P4//'
+    '8/w38GIAXDIBKE0DHxgljNBAAO9TXL0Y4OHwAAAABJRU5ErkJggg=='
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -36,10 +59,7 @@ class ApiURLsTests(TestCase):
         cls.authorized_client_two = Client()
         cls.authorized_client_one.force_login(cls.user_one)
         cls.authorized_client_two.force_login(cls.user_two)
-        cls.test_image = (
-            'iVBORw0KGgoAAAANSUhEUgAAAAUAAAAFCAYAAACNbyblAAAAHElEQVQI12P4//'
-            '8/w38GIAXDIBKE0DHxgljNBAAO9TXL0Y4OHwAAAABJRU5ErkJggg=='
-        )
+        cls.test_image = TEST_IMAGE
         cls.image_file = ContentFile(
             base64.b64decode(cls.test_image), name='test_image.png')
         cls.tag = Tag.objects.create(
@@ -131,3 +151,939 @@ class ApiURLsTests(TestCase):
                     response.status_code, status,
                     f'Адрес {address} недоступен.'
                 )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeQueriesTests(TestCase):
+    """Тестирует количество запросов к базе при выдаче рецептов."""
+    RECIPES_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [
+            Tag.objects.create(name=f'tag_{i}', slug=f'tag_{i}')
+            for i in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient_{i}', measurement_unit='г')
+            for i in range(5)]
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@mail.ru')
+            cls.create_recipe(author, f'recipe_{i}')
+
+    @classmethod
+    def create_recipe(cls, author, name):
+        recipe = Recipe.objects.create(
+            name=name, text='text', cooking_time=5,
+            image='recipes/test_image.png', author=author)
+        for tag in cls.tags:
+            TagRecipe.objects.create(tag=tag, recipe=recipe)
+        for ingredient in cls.ingredients:
+            IngredientRecipe.objects.create(
+                ingredient=ingredient, recipe=recipe, ingredient_amount=2)
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_recipe_list_queries_do_not_depend_on_page_size(self):
+        """Число запросов одинаково для страниц разного размера."""
+        url = reverse('api:recipe-list')
+        for limit in (1, 6, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(self.RECIPES_QUERIES):
+                    response = self.client.get(url, {'limit': limit})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(response.json()['results']), limit)
+                with self.assertNumQueries(self.RECIPES_QUERIES - 3):
+                    self.client.get(url, {'limit': limit})
+
+    def test_recipe_list_count_is_cached(self):
+        """COUNT для одного набора фильтров выполняется один раз."""
+        url = reverse('api:recipe-list')
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(response.json()['count'], 10)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'limit': 1, 'page': 2})
+        self.assertEqual(response.json()['count'], 10)
+        self.assertEqual(self.get_recipe_counts(context), [])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'cursor': '', 'limit': 1})
+        self.assertEqual(self.get_recipe_counts(context), [])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'author': self.user.id})
+        self.assertEqual(len(self.get_recipe_counts(context)), 1)
+
+    def test_recipe_list_count_follows_user_actions(self):
+        """Новое избранное и новый рецепт сразу видны на страницах."""
+        url = reverse('api:recipe-list')
+        recipes = list(Recipe.objects.all())
+        for recipe in recipes[:6]:
+            self.client.post(reverse('api:recipe-favorite', args=(recipe.id,)))
+        params = {'is_favorited': 1, 'limit': 6}
+        data = self.client.get(url, params).json()
+        self.assertEqual((data['count'], data['next']), (6, None))
+        self.client.post(
+            reverse('api:recipe-favorite', args=(recipes[6].id,)))
+        data = self.client.get(url, params).json()
+        self.assertEqual(data['count'], 7)
+        response = self.client.get(url, {**params, 'page': 2})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['results']), 1)
+        params = {'author': self.user.id}
+        self.assertEqual(self.client.get(url, params).json()['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe(self.user, 'own recipe')
+        self.assertEqual(self.client.get(url, params).json()['count'], 1)
+
+    @staticmethod
+    def get_recipe_counts(context):
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(' in query['sql'].upper()
+            and '"contents_recipe"' in query['sql']]
+
+    def test_recipe_list_flags_user_state(self):
+        """Флаги избранного, покупок и подписки берутся из кэша состояния."""
+        recipe = Recipe.objects.get(name='recipe_0')
+        self.user.favorites.create(recipe=recipe)
+        self.user.shopping_cart.create(recipe=recipe)
+        self.user.subscriptions.create(author=recipe.author)
+        response = self.client.get(
+            reverse('api:recipe-detail', args=(recipe.id,)))
+        data = response.json()
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertTrue(data['author']['is_subscribed'])
+        self.assertEqual(len(data['ingredients']), len(self.ingredients))
+        self.assertEqual(len(data['tags']), len(self.tags))
+
+    def test_cached_user_state_follows_favorite_action(self):
+        """Кэш состояния пользователя обновляется при изменении избранного."""
+        recipe = Recipe.objects.get(name='recipe_1')
+        url = reverse('api:recipe-detail', args=(recipe.id,))
+        favorite_url = reverse('api:recipe-favorite', args=(recipe.id,))
+        self.assertFalse(self.client.get(url).json()['is_favorited'])
+        self.client.post(favorite_url)
+        self.assertTrue(self.client.get(url).json()['is_favorited'])
+        self.client.delete(favorite_url)
+        self.assertFalse(self.client.get(url).json()['is_favorited'])
+
+    def test_counters_follow_favorites_and_subscriptions(self):
+        """Счетчики избранного и подписчиков меняются вместе с данными."""
+        recipe = Recipe.objects.get(name='recipe_2')
+        author = recipe.author
+        self.client.post(reverse('api:recipe-favorite', args=(recipe.id,)))
+        self.client.post(reverse('api:user-subscribe', args=(author.id,)))
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+        self.client.delete(reverse('api:recipe-favorite', args=(recipe.id,)))
+        self.client.delete(reverse('api:user-subscribe', args=(author.id,)))
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(author.followers_count, 0)
+
+    def test_concurrent_duplicates_return_bad_request(self):
+        """Дубликат, прошедший проверку одновременно с первым, дает 400."""
+        recipe = Recipe.objects.get(name='recipe_3')
+        cases = (
+            (FavoriteSerializer, 'api:recipe-favorite', recipe.id,
+             'Рецепт уже добавлен в избранное!'),
+            (ShoppingCartSerializer, 'api:recipe-shopping-cart', recipe.id,
+             'Рецепт уже добавлен в список покупок!'),
+            (SubscriptionSerializer, 'api:user-subscribe', recipe.author.id,
+             'Вы уже подписаны на автора!'),
+        )
+        for serializer_class, url_name, pk, message in cases:
+            with self.subTest(url_name=url_name):
+                url = reverse(url_name, args=(pk,))
+                self.client.post(url)
+                with mock.patch.object(
+                        serializer_class, 'validate', lambda self, data: data):
+                    response = self.client.post(url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST)
+                self.assertEqual(
+                    response.json(), {'non_field_errors': [message]})
+
+    def test_cursor_pagination_walks_whole_feed(self):
+        """Пагинация по курсору обходит ленту без COUNT и без повторов."""
+        url = reverse('api:recipe-list')
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        self.client.get(url, {'cursor': '', 'limit': 1})
+        received = []
+        next_url = f'{url}?cursor=&limit=4'
+        while next_url:
+            with self.assertNumQueries(self.RECIPES_QUERIES - 3):
+                response = self.client.get(next_url)
+            data = response.json()
+            self.assertNotIn('count', data)
+            received.extend(recipe['id'] for recipe in data['results'])
+            next_url = data['next']
+        self.assertEqual(received, expected)
+        response = self.client.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_favorites_filter_composes_with_other_filters(self):
+        """Фильтр избранного сочетается с фильтром по автору."""
+        recipes = Recipe.objects.filter(name__in=('recipe_0', 'recipe_1'))
+        for recipe in recipes:
+            self.user.favorites.create(recipe=recipe)
+        url = reverse('api:recipe-list')
+        with self.assertNumQueries(self.RECIPES_QUERIES):
+            response = self.client.get(url, {'is_favorited': 1})
+        self.assertEqual(response.json()['count'], 2)
+        response = self.client.get(
+            url, {'is_favorited': 1, 'author': recipes[0].author.id})
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertTrue(data['results'][0]['is_favorited'])
+        response = self.client.get(url, {'is_favorited': 0})
+        self.assertEqual(response.json()['count'], 8)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteTests(TestCase):
+    """Тестирует создание и изменение рецептов."""
+    CREATE_QUERIES = 13
+    UPDATE_QUERIES = 18
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [
+            Tag.objects.create(name=f'tag_{i}', slug=f'tag_{i}')
+            for i in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient_{i}', measurement_unit='г')
+            for i in range(30)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get_payload(self, ingredients, tags):
+        return {
+            'name': 'recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'image': f'data:image/png;base64,{TEST_IMAGE}',
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in ingredients],
+            'tags': [tag.id for tag in tags],
+        }
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        """Число запросов при создании не зависит от числа ингредиентов."""
+        url = reverse('api:recipe-list')
+        for count in (1, 20):
+            with self.subTest(count=count):
+                cache.clear()
+                payload = self.get_payload(
+                    self.ingredients[:count], self.tags)
+                with self.assertNumQueries(self.CREATE_QUERIES):
+                    response = self.client.post(
+                        url, payload, content_type='application/json')
+                self.assertEqual(
+                    response.status_code, HTTPStatus.CREATED)
+                self.assertEqual(len(response.json()['ingredients']), count)
+
+    def test_create_with_unknown_ingredient(self):
+        """Неизвестный ингредиент возвращает ошибку 400."""
+        payload = self.get_payload(self.ingredients[:2], self.tags)
+        payload['ingredients'].append({'id': 0, 'amount': 1})
+        response = self.client.post(
+            reverse('api:recipe-list'), payload,
+            content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_queries_do_not_depend_on_ingredients(self):
+        """Изменение рецепта выполняется фиксированным числом запросов."""
+        for count in (2, 20):
+            with self.subTest(count=count):
+                response = self.client.post(
+                    reverse('api:recipe-list'),
+                    self.get_payload(self.ingredients[:count], self.tags),
+                    content_type='application/json')
+                url = reverse(
+                    'api:recipe-detail', args=(response.json()['id'],))
+                payload = self.get_payload(
+                    self.ingredients[count // 2:count + count // 2],
+                    self.tags[1:])
+                payload['ingredients'][0]['amount'] = 100
+                cache.clear()
+                with self.assertNumQueries(self.UPDATE_QUERIES):
+                    response = self.client.patch(
+                        url, payload, content_type='application/json')
+                data = response.json()
+                self.assertEqual(len(data['ingredients']), count)
+                self.assertEqual(data['ingredients'][0]['amount'], 100)
+                self.assertEqual(len(data['tags']), len(self.tags) - 1)
+
+
+class SubscriptionsTests(TestCase):
+    """Тестирует ленту подписок."""
+    SUBSCRIPTIONS_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='follower', email='follower@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        for i in range(3):
+            author = User.objects.create_user(
+                username=f'writer{i}', email=f'writer{i}@mail.ru')
+            for j in range(5):
+                Recipe.objects.create(
+                    name=f'recipe_{i}_{j}', text='text', cooking_time=5,
+                    image='recipes/test_image.png', author=author)
+            cls.user.subscriptions.create(author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('api:user-subscriptions')
+
+    def test_recipes_limit_is_applied_in_database(self):
+        """В ленту попадает не больше recipes_limit рецептов автора."""
+        with self.assertNumQueries(self.SUBSCRIPTIONS_QUERIES):
+            self.client.get(self.url, {'recipes_limit': 2})
+        for recipes_limit in (0, 2):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    self.url, {'recipes_limit': recipes_limit})
+                for author in response.json()['results']:
+                    self.assertEqual(len(author['recipes']), recipes_limit)
+                    self.assertEqual(author['recipes_count'], 5)
+                    self.assertTrue(author['is_subscribed'])
+        response = self.client.get(self.url)
+        recipes = response.json()['results'][0]['recipes']
+        self.assertEqual(
+            [recipe['name'] for recipe in recipes],
+            [f'recipe_0_{j}' for j in range(4, -1, -1)])
+
+    def test_invalid_recipes_limit(self):
+        """Некорректный recipes_limit возвращает ошибку 400."""
+        for recipes_limit in ('abc', -1):
+            with self.subTest(recipes_limit=recipes_limit):
+                cache.clear()
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        self.url, {'recipes_limit': recipes_limit})
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class ShoppingListTests(TestCase):
+    """Тестирует сборку списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@mail.ru')
+        salt_gram = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        salt_spoon = Ingredient.objects.create(
+            name='соль', measurement_unit='ст. л.')
+        for amount in (10, 15):
+            recipe = Recipe.objects.create(
+                name=f'recipe_{amount}', text='text', cooking_time=5,
+                image='recipes/test_image.png', author=cls.user)
+            IngredientRecipe.objects.create(
+                ingredient=salt_gram, recipe=recipe,
+                ingredient_amount=amount)
+            IngredientRecipe.objects.create(
+                ingredient=salt_spoon, recipe=recipe, ingredient_amount=1)
+            cls.user.shopping_cart.create(recipe=recipe)
+
+    def test_shopping_list_sums_by_name_and_unit(self):
+        """Количества суммируются отдельно для разных единиц измерения."""
+        with self.assertNumQueries(1):
+            shopping_list = get_shopping_list(self.user)
+        self.assertEqual(shopping_list, [
+            {'name': 'соль', 'measurement_unit': 'г', 'amount': 25},
+            {'name': 'соль', 'measurement_unit': 'ст. л.', 'amount': 2},
+        ])
+
+    def test_shopping_list_is_streamed_without_files(self):
+        """Список покупок отдается потоком и не оставляет файлов."""
+        token = Token.objects.create(user=self.user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = client.get(
+                    reverse('api:recipe-download-shopping-cart'))
+            self.assertEqual(os.listdir(media_root), [])
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('1. соль - 25 (г)', content)
+        self.assertIn('2. соль - 2 (ст. л.)', content)
+
+    def test_shopping_list_cache_is_evicted_by_size(self):
+        """Кэш на диске переиспользует файл и не превышает лимит."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stale_file = os.path.join(cache_dir, 'stale.txt')
+            with open(stale_file, 'wb') as file_obj:
+                file_obj.write(b'0' * 100)
+            os.utime(stale_file, (0, 0))
+            with override_settings(
+                SHOPPING_LIST_CACHE_DIR=cache_dir,
+                SHOPPING_LIST_CACHE_MAX_SIZE=1024,
+            ):
+                shopping_list = get_shopping_list(self.user)
+                first = get_cached_file(self.user, shopping_list, 'txt')
+                second = get_cached_file(self.user, shopping_list, 'txt')
+            self.assertEqual(first, second)
+            self.assertEqual(os.listdir(cache_dir), [os.path.basename(first)])
+
+    def test_shopping_list_pdf(self):
+        """Список покупок можно скачать в формате .pdf на нескольких листах."""
+        token = Token.objects.create(user=self.user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = client.get(
+            reverse('api:recipe-download-shopping-cart'), {'format': 'pdf'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF'))
+        long_list = [
+            {'name': f'продукт {i}', 'measurement_unit': 'г', 'amount': i}
+            for i in range(200)]
+        pdf = b''.join(render_shopping_list_pdf(self.user, long_list))
+        self.assertGreater(pdf.count(b'/Type /Page\n'), 1)
+
+    def test_shopping_list_errors_are_json(self):
+        """Ошибки при скачивании в .pdf и .txt отдаются как JSON."""
+        url = reverse('api:recipe-download-shopping-cart')
+        for extension in ('pdf', 'txt'):
+            with self.subTest(extension=extension):
+                response = Client().get(url, {'format': extension})
+                self.assertEqual(
+                    response.status_code, HTTPStatus.UNAUTHORIZED)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json')
+                self.assertIn('detail', response.json())
+
+
+class IngredientSearchTests(TestCase):
+    """Тестирует поиск ингредиентов по названию."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('сок яблочный', 'яблоки', 'пюре яблочное', 'груши'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def test_prefix_matches_go_first(self):
+        """Совпадения по началу названия выводятся первыми."""
+        response = self.client.get(
+            reverse('api:ingredient-list'), {'name': 'ябл'})
+        names = [item['name'] for item in response.json()]
+        self.assertEqual(names, ['яблоки', 'пюре яблочное', 'сок яблочный'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_search_results_are_limited(self):
+        """Число найденных ингредиентов ограничено настройкой."""
+        response = self.client.get(
+            reverse('api:ingredient-list'), {'name': 'ябл'})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_index_search_does_not_query_database(self):
+        """Повторный поиск обслуживается индексом без запросов к базе."""
+        url = reverse('api:ingredient-list')
+        self.client.get(url, {'name': 'груш'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'name': 'сок'})
+        self.assertEqual(response.json()[0]['name'], 'сок яблочный')
+
+    def test_index_is_invalidated_on_save(self):
+        """Новый ингредиент сразу попадает в результаты поиска."""
+        url = reverse('api:ingredient-list')
+        self.client.get(url, {'name': 'яблоко'})
+        Ingredient.objects.create(name='яблоко печеное', measurement_unit='г')
+        response = self.client.get(url, {'name': 'яблоко'})
+        self.assertEqual(response.json()[0]['name'], 'яблоко печеное')
+
+    @override_settings(INGREDIENT_INDEX_ENABLED=False)
+    def test_database_search_fallback(self):
+        """При отключенном индексе поиск выполняется в базе."""
+        response = self.client.get(
+            reverse('api:ingredient-list'), {'name': 'ябл'})
+        names = [item['name'] for item in response.json()]
+        self.assertEqual(names, ['яблоки', 'пюре яблочное', 'сок яблочный'])
+
+
+class ResponseCacheTests(TestCase):
+    """Тестирует кэш ответов для анонимных пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@mail.ru')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tag = Tag.objects.create(name='tag', slug='tag')
+        cls.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5,
+            image='recipes/test_image.png', author=cls.author)
+        TagRecipe.objects.create(tag=cls.tag, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_response_is_cached(self):
+        """Повторный запрос анонима не обращается к базе."""
+        url = reverse('api:recipe-list')
+        response = self.client.get(url, {'limit': 1, 'tags': 'tag'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'tags': 'tag', 'limit': 1})
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_authenticated_response_is_not_cached(self):
+        """Ответы авторизованным пользователям не кэшируются."""
+        client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        url = reverse('api:tag-list')
+        for _ in range(2):
+            response = client.get(url)
+            self.assertNotIn('X-Cache', response)
+
+    def test_cache_is_invalidated_on_write(self):
+        """Изменение тэга сбрасывает закэшированные ответы."""
+        url = reverse('api:tag-detail', args=(self.tag.id,))
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=self.tag.pk).update(name='new')
+            Tag.objects.get(pk=self.tag.pk).save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'new')
+
+    def test_login_does_not_invalidate_cache(self):
+        """Вход пользователя не сбрасывает кэш, смена имени сбрасывает."""
+        self.author.set_password('Password-1')
+        self.author.save()
+        generation = get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api:login'), {
+                'email': 'author@mail.ru', 'password': 'Password-1'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(get_generation(), generation)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'new'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        self.assertEqual(get_generation(), generation + 1)
+
+
+class ConditionalGetTests(TestCase):
+    """Тестирует ответы 304 для списка и отдельного рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.author = User.objects.create_user(
+            username='author', email='author@mail.ru')
+        cls.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5,
+            image='recipes/test_image.png', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_not_modified_without_serialization(self):
+        """Актуальный ETag дает 304 без связанных объектов и сериализации."""
+        for url in (reverse('api:recipe-list'),
+                    reverse('api:recipe-detail', args=(self.recipe.id,))):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_etag_follows_recipe_and_user_state(self):
+        """ETag меняется при изменении рецепта и избранного."""
+        url = reverse('api:recipe-detail', args=(self.recipe.id,))
+        etag = self.client.get(url)['ETag']
+        self.user.favorites.create(recipe=self.recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.json()['is_favorited'])
+        etag = response['ETag']
+        self.recipe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_follows_related_objects(self):
+        """ETag меняется при изменении автора, тэгов и ингредиентов."""
+        tag = Tag.objects.create(name='tag', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='г')
+        TagRecipe.objects.create(tag=tag, recipe=self.recipe)
+        IngredientRecipe.objects.create(
+            ingredient=ingredient, recipe=self.recipe, ingredient_amount=1)
+        self.author.refresh_from_db()
+        changes = (
+            (self.author, 'first_name'),
+            (tag, 'color'),
+            (ingredient, 'measurement_unit'),
+        )
+        for url in (reverse('api:recipe-list'),
+                    reverse('api:recipe-detail', args=(self.recipe.id,))):
+            for obj, field in changes:
+                with self.subTest(url=url, field=field):
+                    etag = self.client.get(url)['ETag']
+                    setattr(obj, field, f'{getattr(obj, field)}1')
+                    obj.save()
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_follows_deletion(self):
+        """Удаление рецепта меняет ETag списка."""
+        url = reverse('api:recipe-list')
+        Recipe.objects.create(
+            name='second', text='text', cooking_time=5,
+            image='recipes/test_image.png', author=self.author)
+        etag = self.client.get(url, {'limit': 1})['ETag']
+        self.assertNotIn('Last-Modified', self.client.get(url))
+        self.recipe.delete()
+        cache.clear()
+        response = self.client.get(url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_anonymous_if_modified_since(self):
+        """Аноним получает 304 по Last-Modified и из кэша ответов."""
+        url = reverse('api:recipe-detail', args=(self.recipe.id,))
+        last_modified = self.client.get(url)['Last-Modified']
+        self.client = Client()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class ConnectionSettingsCheckTests(TestCase):
+    """Тестирует проверку настроек соединений с базой."""
+
+    def get_check_ids(self, **database):
+        database.setdefault('ENGINE', 'django.db.backends.postgresql')
+        return [
+            warning.id
+            for warning in get_connection_warnings('default', database)]
+
+    def test_connection_settings(self):
+        """Предупреждения о новых и бессрочных соединениях."""
+        self.assertEqual(self.get_check_ids(CONN_MAX_AGE=60), [])
+        self.assertEqual(self.get_check_ids(CONN_MAX_AGE=0), ['api.W001'])
+        self.assertEqual(
+            self.get_check_ids(CONN_MAX_AGE=None), ['api.W002'])
+        self.assertEqual(self.get_check_ids(
+            CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True), [])
+
+
+class TokenCacheTests(TestCase):
+    """Тестирует кэширование аутентификации по токену."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@mail.ru',
+            password='Old-password1')
+
+    def setUp(self):
+        cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('api:user-users-me')
+
+    def test_warm_token_does_not_query_database(self):
+        """Повторный запрос с тем же токеном не обращается к базе."""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['username'], 'reader')
+
+    def test_cache_has_no_secrets(self):
+        """В кэше нет ни токена, ни хэша пароля."""
+        self.client.get(self.url)
+        cached = repr(cache.get(get_token_cache_key(self.token.key)))
+        self.assertIn('reader', cached)
+        self.assertNotIn(self.token.key, cached)
+        self.assertNotIn(self.user.password, cached)
+
+    def test_logout_invalidates_token(self):
+        """После выхода закэшированный токен не принимается."""
+        self.client.get(self.url)
+        response = self.client.post(reverse('api:logout'))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_password_change_invalidates_user(self):
+        """После смены пароля пользователь загружается заново."""
+        self.client.get(self.url)
+        self.client.post(reverse('api:user-set-password'), {
+            'current_password': 'Old-password1',
+            'new_password': 'New-password1'})
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(
+            response.wsgi_request.user.check_password('New-password1'))
+
+
+@override_settings(
+    QUERY_INSTRUMENTATION_ENABLED=True, QUERY_BUDGET_RAISE=True)
+class QueryInstrumentationTests(TestCase):
+    """Тестирует метрики запросов к базе и бюджеты запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        Tag.objects.create(name='tag', slug='tag')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_metrics_are_exposed(self):
+        """Метрики попадают в Server-Timing и в лог."""
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('api:tag-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['endpoint'], 'TagViewSet.list')
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(record['duplicates'], [])
+
+    @override_settings(QUERY_BUDGETS={'TagViewSet.list': 1})
+    def test_budget_is_enforced(self):
+        """Превышение бюджета запросов вызывает исключение."""
+        with self.assertLogs('api.instrumentation', 'INFO'):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('api:tag-list'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryRegressionTests(TestCase):
+    """
+    Ограничивает число запросов и время ответа каждой конечной точки
+    на реалистичном объеме данных. Запросы выполняются на холодном
+    кэше, поэтому бюджеты включают аутентификацию.
+    """
+    RECIPES = 200
+    INGREDIENTS_PER_RECIPE = 22
+    MAX_TIME = 2.0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@mail.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.authors = User.objects.bulk_create(
+            User(username=f'author{i}', email=f'author{i}@mail.ru')
+            for i in range(30))
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'tag_{i}', slug=f'tag_{i}', color=f'#00000{i}')
+            for i in range(6))
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient_{i}', measurement_unit='г')
+            for i in range(40))
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'recipe_{i}', text='text ' * 100, cooking_time=5,
+                   image='recipes/test_image.png',
+                   author=cls.authors[i % len(cls.authors)])
+            for i in range(cls.RECIPES))
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag=cls.tags[(i + shift) % 6])
+            for i, recipe in enumerate(recipes) for shift in range(2))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient=cls.ingredients[(i + shift) % 40],
+                ingredient_amount=shift + 1)
+            for i, recipe in enumerate(recipes)
+            for shift in range(cls.INGREDIENTS_PER_RECIPE))
+        Favorites.objects.bulk_create(
+            Favorites(user=user, recipe=recipe)
+            for user in (cls.user, *cls.authors[:10])
+            for recipe in recipes[:50])
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in recipes[:20])
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=cls.user, author=author)
+            for author in cls.authors[:10])
+        recount_counters()
+        cls.recipe = recipes[100]
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def assertWithinBudget(self, max_queries, method, url, data=None,
+                           status=HTTPStatus.OK):
+        """Выполняет запрос на холодном кэше и проверяет бюджет."""
+        cache.clear()
+        kwargs = {} if method == 'get' else {
+            'content_type': 'application/json'}
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, status)
+        self.assertLessEqual(
+            len(context), max_queries, '\n'.join(
+                query['sql'] for query in context.captured_queries))
+        self.assertLess(elapsed, self.MAX_TIME)
+        return response
+
+    def test_recipe_list(self):
+        """Лента рецептов со всеми фильтрами."""
+        url = reverse('api:recipe-list')
+        # Фильтр по тэгам проверяет слаги отдельным запросом,
+        # а курсор не считает общее число рецептов.
+        cases = (
+            ({}, 6),
+            ({'limit': 50}, 6),
+            ({'page': 5}, 6),
+            ({'tags': ['tag_0', 'tag_3']}, 7),
+            ({'author': self.authors[0].id}, 6),
+            ({'is_favorited': 1}, 6),
+            ({'is_in_shopping_cart': 1}, 6),
+            ({'is_favorited': 0, 'tags': 'tag_1'}, 7),
+            ({'cursor': ''}, 5),
+        )
+        for params, max_queries in cases:
+            with self.subTest(params=params):
+                self.assertWithinBudget(max_queries, 'get', url, params)
+
+    def test_recipe_detail(self):
+        """Отдельный рецепт."""
+        self.assertWithinBudget(
+            6, 'get', reverse('api:recipe-detail', args=(self.recipe.id,)))
+
+    def test_users(self):
+        """Список пользователей, профиль и подписки."""
+        self.assertWithinBudget(4, 'get', reverse('api:user-list'))
+        self.assertWithinBudget(2, 'get', reverse('api:user-users-me'))
+        self.assertWithinBudget(
+            5, 'get', reverse('api:user-subscriptions'),
+            {'recipes_limit': 3})
+
+    def test_toggles(self):
+        """Избранное, список покупок и подписка."""
+        recipe = Recipe.objects.get(name='recipe_150')
+        # Создание выполняется в savepoint: внутри транзакции теста это
+        # два дополнительных запроса SAVEPOINT и RELEASE.
+        cases = (
+            ('api:recipe-favorite', 7, 6),
+            ('api:recipe-shopping-cart', 6, 5),
+        )
+        for name, post_queries, delete_queries in cases:
+            with self.subTest(name=name):
+                url = reverse(name, args=(recipe.id,))
+                self.assertWithinBudget(
+                    post_queries, 'post', url, status=HTTPStatus.CREATED)
+                self.assertWithinBudget(
+                    delete_queries, 'delete', url,
+                    status=HTTPStatus.NO_CONTENT)
+        url = reverse('api:user-subscribe', args=(self.authors[20].id,))
+        self.assertWithinBudget(
+            9, 'post', url, status=HTTPStatus.CREATED)
+        self.assertWithinBudget(
+            6, 'delete', url, status=HTTPStatus.NO_CONTENT)
+
+    def test_recipe_write(self):
+        """Создание и изменение рецепта."""
+        payload = {
+            'name': 'new recipe',
+            'text': 'text',
+            'cooking_time': 10,
+            'image': f'data:image/png;base64,{TEST_IMAGE}',
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in self.ingredients[:25]],
+            'tags': [tag.id for tag in self.tags[:3]],
+        }
+        response = self.assertWithinBudget(
+            13, 'post', reverse('api:recipe-list'), payload,
+            status=HTTPStatus.CREATED)
+        payload['ingredients'] = [
+            {'id': ingredient.id, 'amount': 7}
+            for ingredient in self.ingredients[10:35]]
+        self.assertWithinBudget(
+            18, 'patch',
+            reverse('api:recipe-detail', args=(response.json()['id'],)),
+            payload)
+
+    def test_shopping_list_download(self):
+        """Скачивание списка покупок."""
+        url = reverse('api:recipe-download-shopping-cart')
+        for extension in ('txt', 'pdf'):
+            with self.subTest(extension=extension):
+                self.assertWithinBudget(2, 'get', url, {'format': extension})
+
+    def test_reference_lists(self):
+        """Тэги и поиск ингредиентов."""
+        self.assertWithinBudget(2, 'get', reverse('api:tag-list'))
+        self.assertWithinBudget(
+            2, 'get', reverse('api:ingredient-list'), {'name': 'ingr'})
+
+
+class SerializerBenchmarkTests(TestCase):
+    """Тестирует команду замера скорости сериализаторов."""
+
+    def test_serializers_do_not_query_database(self):
+        """Сериализация подготовленной страницы не обращается к базе."""
+        user = User.objects.create_user(
+            username='reader', email='reader@mail.ru')
+        author = User.objects.create_user(
+            username='author', email='author@mail.ru')
+        user.subscriptions.create(author=author)
+        Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5,
+            image='recipes/test_image.png', author=author)
+        output = StringIO()
+        call_command(
+            'benchmark_serializers', sizes=[1], repeat=1, stdout=output)
+        self.assertEqual(output.getvalue().count('объектов/с'), 3)
@@ -1,13 +1,20 @@
-from rest_framework import viewsets, status, filters
+import hashlib
+
+from rest_framework import viewsets, status
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.permissions import (
     IsAuthenticated, IsAuthenticatedOrReadOnly)
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Q
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date, quote_etag
 
 from users.models import User
 from contents.models import Tag, Ingredient, Recipe, Subscriptions
@@ -15,11 +22,17 @@ from .serializers import (
     UserSerializer, SetPasswordSerializer, TagSerializer,
     IngredientSerializer, RecipeSerializer, FavoriteSerializer,
     ShoppingCartSerializer, SubscriptionSerializer)
-from .filters import RecipeFilter
-from .core.utils import save_shopping_list
+from .filters import RecipeFilter, IngredientSearchFilter
+from .core.shopping_list import (
+    RENDERERS, get_shopping_list, shopping_list_response)
+from .core.search import ingredient_index
+from .core.querysets import get_recipe_prefetches, get_recipes_queryset
+from .core import response_cache
+from .core.user_state import get_user_state_version
 from .permissions import (
     IsAuthorAdminOrReadOnly, IsNewUserAuthorAdminOrReadOnly, IsAuthorOrAdmin)
-from .pagination import LimitPageNumberPagination
+from .pagination import LimitPageNumberPagination, RecipeFeedPagination
+from .renderers import ShoppingListTXTRenderer, ShoppingListPDFRenderer
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -30,19 +43,31 @@ class UserViewSet(viewsets.ModelViewSet):
     pagination_class = LimitPageNumberPagination
 
     def get_queryset(self):
-        subscribed = Count(
-            'followers', filter=Q(
-                followers__user__username=self.request.user.get_username()))
-        queryset = User.objects.annotate(
-            is_subscribed=subscribed
-        ).order_by('username')
-        return queryset
+        return User.objects.order_by('username')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['user'] = self.request.user
         return context
 
+    def get_recipes_limit(self):
+        """
+        Проверяет параметр recipes_limit до выполнения запросов к базе.
+        Возвращает None, если ограничение не задано.
+        """
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            raise ValidationError(
+                {'recipes_limit': 'Укажите целое число рецептов.'})
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Укажите целое неотрицательное число.'})
+        return recipes_limit
+
     @action(
         methods=['get', 'patch'], detail=False, url_path='me',
         permission_classes=(IsAuthorOrAdmin,))
@@ -67,7 +92,7 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthorOrAdmin,))
     def set_password(self, request, *args, **kwargs):
         """Конечная точка для смены пароля пользователя."""
-        user = User.objects.get(username=request.user.get_username())
+        user = request.user
         serializer = SetPasswordSerializer(
             instance=user,
             data=request.data,
@@ -80,10 +105,10 @@ class UserViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, *args, **kwargs):
         """Конечная точка для создания и удаления подписки на автора."""
-        user = get_object_or_404(User, username=request.user.get_username())
+        user = request.user
         author = get_object_or_404(User, id=kwargs['pk'])
-        recipes_limit = self.request.query_params.get('recipes_limit')
         if request.method == 'POST':
+            recipes_limit = self.get_recipes_limit()
             data = {
                 'user': user,
                 'author': author,
@@ -110,16 +135,17 @@ class UserViewSet(viewsets.ModelViewSet):
         Конечная точка для получения авторов, на которых подписан пользователь.
         """
         user = request.user
-        recipes_limit = self.request.query_params.get('recipes_limit')
-        subscribed = Count(
-            'user', filter=Q(user__username=user.get_username()))
-        recipes_count = Count('author__recipes')
+        recipes_limit = self.get_recipes_limit()
+        recipes = Recipe.objects.order_by('-pub_date')
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
         queryset = Subscriptions.objects.filter(
             user=user
+        ).select_related(
+            'author'
         ).prefetch_related(
-            'author__recipes'
-        ).annotate(
-            is_subscribed=subscribed, recipes_count=recipes_count
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='feed_recipes')
         ).order_by('author__username')
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
@@ -135,7 +161,144 @@ class ListRetrieveViewSet(ListModelMixin, RetrieveModelMixin,
     pass
 
 
-class TagViewSet(ListRetrieveViewSet):
+class AnonymousCacheMixin:
+    """
+    Кэширует данные ответов list и retrieve для анонимных пользователей.
+    Ответ для всех анонимов одинаков, поэтому повторный запрос
+    не выполняет запросов к базе и сериализацию. Кэш сбрасывается
+    сменой поколения при изменении рецептов, тэгов и ингредиентов.
+    Заголовок X-Cache показывает, был ли ответ взят из кэша.
+    Вместе с данными сохраняются ETag и Last-Modified, поэтому
+    условный запрос из кэша тоже получает ответ 304.
+    """
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED or (
+                request.user.is_authenticated):
+            return handler(request, *args, **kwargs)
+        key = response_cache.get_response_key(request)
+        cached = response_cache.get_cached_data(key)
+        if cached is not None:
+            data, headers = cached
+            response = Response(data, headers=headers)
+            if 'ETag' in headers:
+                last_modified = headers.get('Last-Modified')
+                response = get_conditional_response(
+                    request, etag=headers['ETag'],
+                    last_modified=last_modified and parse_http_date(
+                        last_modified),
+                    response=response)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                header: response[header]
+                for header in self.cached_headers if header in response}
+            response_cache.set_cached_data(key, (response.data, headers))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка ETag для list и ETag с Last-Modified для retrieve.
+    Валидаторы строятся по времени изменения из поля
+    last_modified_field, которое обновляется и при изменении авторов,
+    тэгов и ингредиентов рецепта. При совпадении валидаторов клиент
+    получает ответ 304 без загрузки связанных объектов и сериализации.
+    """
+    last_modified_field = 'updated_at'
+    validators = None
+
+    def get_prefetch_lookups(self):
+        """Связанные объекты, которые нужны только для сериализации."""
+        return ()
+
+    def get_conditional_response(self, request, parts, last_modified=None):
+        """
+        Проверяет If-None-Match и If-Modified-Since до сериализации.
+        ETag строится по адресу запроса, частям parts и версии
+        состояния пользователя. Флаги избранного и подписок меняются
+        без изменения объектов, поэтому для авторизованных
+        пользователей учитывается только ETag.
+        Возвращает ответ 304 или None, если ответ нужно сформировать.
+        """
+        user = request.user
+        version = get_user_state_version(user) if (
+            user.is_authenticated) else ''
+        payload = repr((request.get_full_path(), version, parts))
+        self.validators = (
+            quote_etag(hashlib.md5(payload.encode()).hexdigest()),
+            int(last_modified.timestamp()) if last_modified else None)
+        response = get_conditional_response(
+            request, etag=self.validators[0],
+            last_modified=None if user.is_authenticated else (
+                self.validators[1]))
+        return self.set_validators(response)
+
+    def set_validators(self, response):
+        if response is not None and self.validators is not None:
+            etag, last_modified = self.validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        ETag списка строится по id и времени изменения объектов уже
+        выбранной страницы, числу объектов или признаку следующей
+        страницы и поколению кэша ответов, которое меняется при любой
+        записи. Удаление объекта не увеличивает время изменения
+        страницы, поэтому Last-Modified для списка не отдается.
+        """
+        queryset = self.filter_queryset(
+            self.get_queryset()).prefetch_related(None)
+        page = self.paginate_queryset(queryset)
+        objects = list(queryset) if page is None else page
+        response = self.get_conditional_response(request, (
+            response_cache.get_generation(),
+            None if page is None else self.paginator.get_page_state(),
+            [(obj.pk, getattr(obj, self.last_modified_field))
+             for obj in objects]))
+        if response is not None:
+            return response
+        prefetch_related_objects(objects, *self.get_prefetch_lookups())
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        return self.set_validators(response)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            last_modified = self.get_queryset().model.objects.filter(
+                pk=kwargs[self.lookup_field]).values_list(
+                self.last_modified_field, flat=True).first()
+        except ValueError:
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        response = self.get_conditional_response(
+            request, (last_modified,), last_modified)
+        if response is not None:
+            return response
+        return self.set_validators(
+            super().retrieve(request, *args, **kwargs))
+
+
+class TagViewSet(AnonymousCacheMixin, ListRetrieveViewSet):
     """Вьюсет для тэгов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -143,34 +306,39 @@ class TagViewSet(ListRetrieveViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(AnonymousCacheMixin, ListRetrieveViewSet):
     """Вьюсет для ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['^name', 'name']
+    filter_backends = (IngredientSearchFilter,)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по ?name= обслуживается индексом в памяти без запросов
+        к базе, если INGREDIENT_INDEX_ENABLED включен.
+        """
+        term = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        if settings.INGREDIENT_INDEX_ENABLED and term.strip():
+            return Response(ingredient_index.search(term))
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousCacheMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorAdminOrReadOnly,)
-    pagination_class = LimitPageNumberPagination
+    pagination_class = RecipeFeedPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        username = self.request.user.get_username()
-        favorited = Count('favorites', filter=Q(
-            favorites__user__username=username))
-        shopping_cart = Count('shopping_cart', filter=Q(
-            shopping_cart__user__username=username))
-        queryset = Recipe.objects.annotate(
-            is_favorited=favorited, is_in_shopping_cart=shopping_cart
-        ).order_by('-pub_date')
-        return queryset
+        return get_recipes_queryset()
+
+    def get_prefetch_lookups(self):
+        return get_recipe_prefetches()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -178,7 +346,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return context
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
 
     @action(methods=['post', 'delete'], detail=True, url_path='favorite',
             permission_classes=(IsAuthenticated,))
@@ -186,7 +359,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Конечная точка для добавления и удаления рецептов из избранного."""
         recipe_id = kwargs.get('pk')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        user = get_object_or_404(User, username=request.user.get_username())
+        user = request.user
         if request.method == 'POST':
             new_data = {
                 'user': user,
@@ -213,7 +386,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         recipe_id = kwargs.get('pk')
         recipe = get_object_or_404(Recipe, id=recipe_id)
-        user = get_object_or_404(User, username=request.user.get_username())
+        user = request.user
         if request.method == 'POST':
             new_data = {
                 'user': user,
@@ -234,25 +407,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['get'], detail=False, url_path='download_shopping_cart',
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(
+                JSONRenderer, ShoppingListTXTRenderer,
+                ShoppingListPDFRenderer))
     def download_shopping_cart(self, request, *args, **kwargs):
-        """Конечная точка для скачивания списка покупок."""
-        user = get_object_or_404(User, username=request.user.get_username())
-        shoping_cart = user.shopping_cart.all()
-        ingredient_list = {}
-        for shopping_item in shoping_cart:
-            recipe = shopping_item.recipe
-            ingredient_recipe_set = recipe.ingredient_recipe_set.all()
-            for item in ingredient_recipe_set:
-                name = item.ingredient.name
-                measure = item.ingredient.measurement_unit
-                amount = item.ingredient_amount
-                if name in ingredient_list:
-                    ingredient_list[name]['amount'] += amount
-                else:
-                    ingredient_list[name] = {
-                        'amount': amount,
-                        'measurement_unit': measure
-                    }
-        saved_file = save_shopping_list(user, ingredient_list)
-        return FileResponse(open(saved_file, 'rb'), as_attachment=True)
+        """
+        Конечная точка для скачивания списка покупок.
+        Формат файла выбирается параметром ?format=txt|pdf.
+        """
+        extension = request.accepted_renderer.format
+        if extension not in RENDERERS:
+            extension = 'txt'
+        shopping_list = get_shopping_list(request.user)
+        return shopping_list_response(request.user, shopping_list, extension)
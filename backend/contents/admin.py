@@ -37,7 +37,7 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description='Добавлено в избранное')
     def favorites_number(self, obj):
         """Число добавлений в избранное."""
-        obj_count = str(obj.favorites.count())
+        obj_count = str(obj.favorites_count)
         measure = get_measure_form(obj_count)
         return f'{obj_count} {measure}'
 
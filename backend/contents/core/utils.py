@@ -1,3 +1,9 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
 def get_measure_form(count: str):
     """Возвращает верную форму слова 'раз' в зависимости от количества."""
     out_of_rule = [12, 13, 14]
@@ -10,3 +16,27 @@ def get_measure_form(count: str):
         else:
             measure = 'раза'
     return measure
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом объектов model, ссылающихся на запись по field."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def recount_counters():
+    """Пересчитывает денормализованные счетчики рецептов и пользователей."""
+    recipe_model = apps.get_model('contents', 'Recipe')
+    favorites_model = apps.get_model('contents', 'Favorites')
+    subscriptions_model = apps.get_model('contents', 'Subscriptions')
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    recipe_model.objects.update(
+        favorites_count=count_subquery(favorites_model, 'recipe'))
+    user_model.objects.update(
+        recipes_count=count_subquery(recipe_model, 'author'),
+        followers_count=count_subquery(subscriptions_model, 'author'))
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from contents.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает время обработки запроса с новым соединением на каждый
+    запрос и с постоянным соединением.
+    Жизненный цикл запроса воспроизводится сигналами request_started
+    и request_finished, по которым Django закрывает устаревшие
+    соединения. Чтобы замерить pgbouncer, укажите его в DB_HOST и DB_PORT.
+    """
+    help = 'Сравнивает задержку запросов с постоянными соединениями и без.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Число запросов в каждом режиме.')
+        parser.add_argument(
+            '--database', default='default',
+            help='Псевдоним базы из DATABASES.')
+
+    def run(self, connection, conn_max_age, requests):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            list(Recipe.objects.using(connection.alias).select_related(
+                'author').order_by('-pub_date')[:6])
+            request_finished.send(sender=self.__class__)
+            timings.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        return timings
+
+    def report(self, name, timings):
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{name}: среднее {statistics.mean(timings):.2f} мс, '
+            f'p50 {percentiles[49]:.2f} мс, p95 {percentiles[94]:.2f} мс')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        conn_max_age = connection.settings_dict['CONN_MAX_AGE']
+        requests = options['requests']
+        try:
+            per_request = self.run(connection, 0, requests)
+            persistent = self.run(connection, None, requests)
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+        self.report('Новое соединение на запрос', per_request)
+        self.report('Постоянное соединение', persistent)
+        speedup = statistics.median(per_request) / statistics.median(
+            persistent)
+        self.stdout.write(self.style.SUCCESS(
+            f'Постоянное соединение быстрее в {speedup:.1f} раза по p50.'))
@@ -1,27 +1,86 @@
 import os
 import csv
+import json
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from contents.models import Ingredient
 
 filename = os.path.join(settings.BASE_DIR.parent, 'data/ingredients.csv')
+FORMATS = ('csv', 'json')
+
+
+def read_csv(file_obj):
+    """Построчно читает ингредиенты из файла csv."""
+    reader = csv.DictReader(file_obj, fieldnames=['name', 'measure'])
+    for row in reader:
+        yield row['name'], row['measure']
+
+
+def read_json(file_obj):
+    """Читает ингредиенты из списка объектов в файле json."""
+    for row in json.load(file_obj):
+        yield row['name'], row['measurement_unit']
 
 
 class Command(BaseCommand):
-    """Записывает данные об ингридиентах из файла csv в базу."""
+    """
+    Записывает данные об ингридиентах из файла csv или json в базу.
+    Повторы отбрасываются в памяти, а существующие в базе
+    ингредиенты пропускаются благодаря ограничению уникальности.
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=filename,
+            help='Путь к файлу с ингредиентами.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число ингредиентов в одном INSERT.')
+
     def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        file_format = kwargs['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Неизвестный формат файла {path}, укажите --format.')
+        reader = read_csv if file_format == 'csv' else read_json
+        batch_size = kwargs['batch_size']
+        start = time.perf_counter()
+        rows = 0
+        seen = set()
+        batch = []
         try:
-            with open(filename, 'r', encoding='utf-8') as file_obj:
-                reader = csv.DictReader(
-                    file_obj, fieldnames=['name', 'measure'])
-                for row in reader:
-                    Ingredient.objects.get_or_create(
-                        name=row['name'].capitalize(),
-                        measurement_unit=row['measure'])
+            with open(path, 'r', encoding='utf-8') as file_obj:
+                with transaction.atomic():
+                    count_before = Ingredient.objects.count()
+                    for name, measure in reader(file_obj):
+                        rows += 1
+                        key = (name.strip().capitalize(), measure.strip())
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        batch.append(Ingredient(
+                            name=key[0], measurement_unit=key[1]))
+                        if len(batch) >= batch_size:
+                            Ingredient.objects.bulk_create(
+                                batch, ignore_conflicts=True)
+                            batch = []
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True)
+                    created = Ingredient.objects.count() - count_before
         except Exception as err:
             raise CommandError('Ошибка при загрузке базы Ingredients', err)
+        elapsed = time.perf_counter() - start
         self.stdout.write(
-            self.style.SUCCESS('Данные успешно записаны в базу!')
+            self.style.SUCCESS(
+                f'Данные успешно записаны в базу! '
+                f'Прочитано строк: {rows}, добавлено: {created}, '
+                f'время: {elapsed:.2f} с '
+                f'({rows / max(elapsed, 1e-6):.0f} строк/с).')
         )
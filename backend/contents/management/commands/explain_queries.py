@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from contents.models import (
+    Recipe, Favorites, ShoppingCart, Subscriptions, IngredientRecipe,
+    TagRecipe, Tag)
+
+
+class Command(BaseCommand):
+    """
+    Выводит планы выполнения самых частых запросов API.
+    Позволяет сравнить планы до и после миграций с индексами.
+    """
+    help = 'Выводит EXPLAIN для частых запросов к рецептам и подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Выполнить запросы и показать фактическое время (ANALYZE).')
+
+    def get_queries(self):
+        """Собирает запросы на реальных id из базы."""
+        favorite = Favorites.objects.order_by('?').first()
+        subscription = Subscriptions.objects.order_by('?').first()
+        recipe_link = IngredientRecipe.objects.order_by('?').first()
+        tag = Tag.objects.order_by('?').first()
+        if not all((favorite, subscription, recipe_link, tag)):
+            raise CommandError(
+                'Недостаточно данных: заполните базу перед запуском.')
+        return {
+            'recipes feed': Recipe.objects.order_by('-pub_date')[:6],
+            'author feed': Recipe.objects.filter(
+                author=subscription.author_id).order_by('-pub_date')[:6],
+            'favorite exists': Favorites.objects.filter(
+                user=favorite.user_id, recipe=favorite.recipe_id),
+            'cart exists': ShoppingCart.objects.filter(
+                user=favorite.user_id, recipe=favorite.recipe_id),
+            'subscription exists': Subscriptions.objects.filter(
+                user=subscription.user_id, author=subscription.author_id),
+            'recipe ingredients': IngredientRecipe.objects.filter(
+                recipe=recipe_link.recipe_id,
+                ingredient=recipe_link.ingredient_id),
+            'recipe tags': TagRecipe.objects.filter(
+                recipe=recipe_link.recipe_id),
+            'tag by slug': Tag.objects.filter(slug=tag.slug),
+        }
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze']:
+            explain_options['analyze'] = True
+            if connection.vendor == 'postgresql':
+                explain_options['buffers'] = True
+        for name, queryset in self.get_queries().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from contents.core.utils import recount_counters
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает счетчики избранного, рецептов и подписчиков.
+    Нужен после массовой загрузки данных в обход сигналов.
+    """
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            recount_counters()
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны!'))
@@ -0,0 +1,220 @@
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from contents.core.utils import recount_counters
+from contents.models import (
+    Favorites, Ingredient, IngredientRecipe, Recipe, ShoppingCart,
+    Subscriptions, Tag, TagRecipe)
+from users.models import User
+
+
+class PowerLaw:
+    """
+    Случайный выбор объектов с вероятностью, убывающей по степенному
+    закону от ранга: вес объекта с рангом r равен 1 / r ** alpha.
+    Ранги назначаются в случайном порядке, поэтому популярные объекты
+    не совпадают с первыми id.
+    """
+
+    def __init__(self, rng, items, alpha):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** alpha for rank in range(1, len(self.items) + 1)))
+
+    def choices(self, k):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=k)
+
+
+class Command(BaseCommand):
+    """
+    Заполняет базу синтетическими данными для нагрузочных тестов.
+    Авторы рецептов, популярные рецепты, активные пользователи
+    избранного и списка покупок выбираются по степенному закону.
+    Данные пишутся пакетами через bulk_create, одинаковый --seed
+    дает одинаковый набор данных на пустой базе. После загрузки
+    пересчитываются денормализованные счетчики.
+    """
+    help = 'Заполняет базу синтетическими пользователями и рецептами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients', type=int, default=1000,
+            help='Сколько ингредиентов создать, если справочник пуст.')
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2,
+            default=(5, 20), metavar=('MIN', 'MAX'))
+        parser.add_argument('--favorites', type=int, default=100000)
+        parser.add_argument('--cart-items', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument(
+            '--author-alpha', type=float, default=1.1,
+            help='Показатель степени для популярности авторов.')
+        parser.add_argument(
+            '--recipe-alpha', type=float, default=0.8,
+            help='Показатель степени для популярности рецептов.')
+        parser.add_argument(
+            '--user-alpha', type=float, default=0.9,
+            help='Показатель степени для активности пользователей.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имен пользователей и рецептов.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        start = time.perf_counter()
+        users = self.stage('Пользователи', self.create_users)
+        tags = self.stage('Тэги', self.create_tags)
+        ingredients = self.stage('Ингредиенты', self.create_ingredients)
+        recipes = self.stage('Рецепты', self.create_recipes, users)
+        self.stage('Тэги рецептов', self.create_recipe_tags, recipes, tags)
+        self.stage(
+            'Ингредиенты рецептов', self.create_recipe_ingredients,
+            recipes, ingredients)
+        self.stage(
+            'Избранное', self.create_pairs, Favorites, 'recipe',
+            users, recipes, options['favorites'])
+        self.stage(
+            'Список покупок', self.create_pairs, ShoppingCart, 'recipe',
+            users, recipes, options['cart_items'])
+        self.stage(
+            'Подписки', self.create_pairs, Subscriptions, 'author',
+            users, users, options['subscriptions'])
+        self.stage('Счетчики', recount_counters)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'База заполнена за {time.perf_counter() - start:.1f} с.'))
+
+    def stage(self, name, func, *args):
+        start = time.perf_counter()
+        with transaction.atomic():
+            result = func(*args)
+        elapsed = time.perf_counter() - start
+        count = len(result) if isinstance(result, list) else result
+        suffix = f': {count}' if count is not None else ''
+        self.stdout.write(f'{name}{suffix} ({elapsed:.1f} с)')
+        return result
+
+    def bulk_create(self, model, objects):
+        """Пишет объекты пакетами, пропуская уже существующие."""
+        created = 0
+        objects = iter(objects)
+        while batch := list(itertools.islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        return created
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'{prefix}_user_{i}',
+                  email=f'{prefix}_user_{i}@example.com',
+                  first_name='Имя', last_name='Фамилия', password=password)
+             for i in range(self.options['users'])),
+            batch_size=self.batch_size, ignore_conflicts=True)
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_user_').order_by(
+            'id').values_list('id', flat=True))
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            (Tag(name=f'Тэг {i}', slug=f'tag_{i}',
+                 color=f'#{self.rng.randrange(0x1000000):06X}')
+             for i in range(self.options['tags'])),
+            ignore_conflicts=True)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_ingredients(self):
+        if not Ingredient.objects.exists():
+            units = ('г', 'кг', 'мл', 'л', 'шт.', 'по вкусу')
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=f'Ингредиент {i}',
+                            measurement_unit=self.rng.choice(units))
+                 for i in range(self.options['ingredients'])),
+                batch_size=self.batch_size)
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def create_recipes(self, users):
+        prefix = self.options['prefix']
+        authors = PowerLaw(self.rng, users, self.options['author_alpha'])
+        author_ids = authors.choices(self.options['recipes'])
+        recipes = Recipe.objects.bulk_create(
+            (Recipe(name=f'{prefix} recipe {i}',
+                    text='Описание рецепта. ' * self.rng.randint(5, 50),
+                    cooking_time=self.rng.randint(5, 180),
+                    image='recipes/seed.png', author_id=author_id)
+             for i, author_id in enumerate(author_ids)),
+            batch_size=self.batch_size)
+        return [recipe.pk for recipe in recipes]
+
+    def create_recipe_tags(self, recipes, tags):
+        max_tags = min(3, len(tags))
+        return self.bulk_create(TagRecipe, (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipes
+            for tag_id in self.rng.sample(
+                tags, self.rng.randint(1, max_tags))))
+
+    def create_recipe_ingredients(self, recipes, ingredients):
+        low, high = self.options['ingredients_per_recipe']
+        high = min(high, len(ingredients))
+        popular = PowerLaw(self.rng, ingredients, 1.0)
+
+        def links():
+            for recipe_id in recipes:
+                chosen = set()
+                count = self.rng.randint(min(low, high), high)
+                while len(chosen) < count:
+                    chosen.update(popular.choices(count - len(chosen)))
+                for ingredient_id in chosen:
+                    yield IngredientRecipe(
+                        recipe_id=recipe_id, ingredient_id=ingredient_id,
+                        ingredient_amount=self.rng.randint(1, 500))
+
+        return self.bulk_create(IngredientRecipe, links())
+
+    def create_pairs(self, model, field, users, targets, total):
+        """
+        Создает до total уникальных пар пользователь - объект.
+        Активные пользователи и популярные объекты встречаются чаще.
+        """
+        actors = PowerLaw(self.rng, users, self.options['user_alpha'])
+        alpha = self.options[
+            'author_alpha' if field == 'author' else 'recipe_alpha']
+        popular = PowerLaw(self.rng, targets, alpha)
+        total = min(total, len(users) * len(targets))
+        seen = set()
+
+        def pairs():
+            attempts = 0
+            while len(seen) < total and attempts < 50:
+                attempts += 1
+                size = min(self.batch_size, total - len(seen))
+                for pair in zip(actors.choices(size), popular.choices(size)):
+                    if pair in seen or (
+                            field == 'author' and pair[0] == pair[1]):
+                        continue
+                    seen.add(pair)
+                    attempts = 0
+                    yield model(user_id=pair[0], **{f'{field}_id': pair[1]})
+
+        return self.bulk_create(model, pairs())
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.2 on 2026-10-18 02:56
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+UNIQUE_FIELDS = {
+    'favorites': ('user', 'recipe'),
+    'shoppingcart': ('user', 'recipe'),
+    'subscriptions': ('user', 'author'),
+    'ingredientrecipe': ('recipe', 'ingredient'),
+    'tagrecipe': ('recipe', 'tag'),
+}
+
+
+SLUG_MAX_LENGTH = 200
+
+
+def lock_tables(apps, schema_editor):
+    """
+    Запрещает запись в таблицы до конца миграции, чтобы между удалением
+    дубликатов и созданием ограничений не появились новые.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in (*UNIQUE_FIELDS, 'tag'):
+        model = apps.get_model('contents', model_name)
+        schema_editor.execute(
+            f'LOCK TABLE {schema_editor.quote_name(model._meta.db_table)} '
+            f'IN SHARE ROW EXCLUSIVE MODE')
+
+
+def rename_duplicate_slugs(apps, schema_editor):
+    """Добавляет id к повторяющимся слагам тэгов, кроме первого."""
+    Tag = apps.get_model('contents', 'Tag')
+    duplicates = Tag.objects.values('slug').annotate(
+        keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        for tag in Tag.objects.filter(slug=duplicate['slug']).exclude(
+                id=duplicate['keep_id']):
+            suffix = f'_{tag.id}'
+            tag.slug = tag.slug[:SLUG_MAX_LENGTH - len(suffix)] + suffix
+            tag.save(update_fields=('slug',))
+
+
+def remove_duplicates(apps, schema_editor):
+    """Удаляет дубликаты перед созданием ограничений уникальности."""
+    lock_tables(apps, schema_editor)
+    rename_duplicate_slugs(apps, schema_editor)
+    for model_name, fields in UNIQUE_FIELDS.items():
+        model = apps.get_model('contents', model_name)
+        keep_ids = model.objects.values(*fields).annotate(
+            keep_id=Min('id')).values('keep_id')
+        model.objects.exclude(id__in=keep_ids).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей должны выполниться до
+        # ALTER TABLE в этой же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0032_alter_favorites_options_alter_ingredient_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(max_length=200, unique=True, verbose_name='слаг'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscriptions',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.2 on 2026-10-18 02:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Объединяет одинаковые ингредиенты перед созданием ограничения:
+    рецепты переводятся на ингредиент с наименьшим id.
+    """
+    Ingredient = apps.get_model('contents', 'Ingredient')
+    IngredientRecipe = apps.get_model('contents', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=keep_id).values_list('id', flat=True)
+        recipes_with_ingredient = set(IngredientRecipe.objects.filter(
+            ingredient_id=keep_id).values_list('recipe_id', flat=True))
+        for link in IngredientRecipe.objects.filter(
+                ingredient_id__in=extra_ids).order_by('id'):
+            if link.recipe_id in recipes_with_ingredient:
+                link.delete()
+                continue
+            link.ingredient_id = keep_id
+            link.save(update_fields=('ingredient',))
+            recipes_with_ingredient.add(link.recipe_id)
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Удаление ингредиентов ставит в очередь отложенные проверки
+        # внешних ключей, а с ними ALTER TABLE в той же транзакции
+        # завершается ошибкой pending trigger events.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0034_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
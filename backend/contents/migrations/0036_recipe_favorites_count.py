@@ -0,0 +1,45 @@
+# Generated by Django 4.2.2 on 2026-10-18 03:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики по данным на момент миграции."""
+    Recipe = apps.get_model('contents', 'Recipe')
+    Favorites = apps.get_model('contents', 'Favorites')
+    Subscriptions = apps.get_model('contents', 'Subscriptions')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorites, 'recipe'))
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Subscriptions, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contents', '0035_ingredient_unique'),
+        ('users', '0010_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
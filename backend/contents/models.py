@@ -14,7 +14,8 @@ class Tag(models.Model):
         help_text='цветовое обозначение тэга')
     slug = models.SlugField(
         verbose_name='слаг',
-        max_length=200)
+        max_length=200,
+        unique=True)
 
     def __repr__(self):
         return self.name
@@ -40,6 +41,11 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'),
+        ]
 
     def __repr__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -82,6 +88,13 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name='дата публикации',
         auto_now_add=True)
+    updated_at = models.DateTimeField(
+        verbose_name='дата изменения',
+        auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='добавлений в избранное',
+        default=0,
+        editable=False)
 
     class Meta:
         verbose_name = 'рецепт'
@@ -92,6 +105,14 @@ class Recipe(models.Model):
                 check=models.Q(cooking_time__gte=1),
                 name='cooking_time_is_more_than_zero'),
         ]
+        indexes = [
+            models.Index(
+                fields=('-pub_date',),
+                name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'),
+        ]
 
     def __repr__(self):
         return f'{self.name} | {self.author}'
@@ -120,6 +141,9 @@ class IngredientRecipe(models.Model):
             models.CheckConstraint(
                 check=models.Q(ingredient_amount__gte=1),
                 name='ingredient_amount_is_more_than_zero'),
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'),
         ]
 
 
@@ -136,6 +160,11 @@ class TagRecipe(models.Model):
     class Meta:
         verbose_name = 'тэг в рецепте'
         verbose_name_plural = 'тэги в рецепте'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'tag'),
+                name='unique_recipe_tag'),
+        ]
 
     def __repr__(self):
         return f'{self.tag.name} | {self.recipe.name}'
@@ -159,6 +188,11 @@ class Favorites(models.Model):
     class Meta:
         verbose_name = 'избранное'
         verbose_name_plural = 'избранное'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'),
+        ]
 
     def __repr__(self):
         return (f'Пользователь {self.user.username} - '
@@ -184,6 +218,11 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = 'список покупок'
         verbose_name_plural = 'списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart'),
+        ]
 
     def __repr__(self):
         return (f'Пользователь {self.user.username} - '
@@ -209,6 +248,11 @@ class Subscriptions(models.Model):
     class Meta:
         verbose_name = 'подписки'
         verbose_name_plural = 'подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_subscription'),
+        ]
 
     def __repr__(self):
         return (f'Подписчик {self.user.username} - '
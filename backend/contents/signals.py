@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Ingredient, Recipe, Favorites, Subscriptions, Tag
+
+User = get_user_model()
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно изменяет счетчик в базе через F-выражение."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorites)
+def increase_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorites)
+def decrease_favorites_count(instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Subscriptions)
+def increase_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscriptions)
+def decrease_followers_count(instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1)
+
+
+def touch_recipes(queryset):
+    """
+    Обновляет время изменения рецептов, когда меняются выводимые
+    вместе с ними автор, тэги или ингредиенты.
+    """
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, **kwargs):
+    if not created and instance.public_data_changed():
+        touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # 3d party
     'rest_framework',
     'rest_framework.authtoken',
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +63,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Соединение с базой переиспользуется между запросами, пока не истечет
+# DB_CONN_MAX_AGE секунд; пустое значение - без ограничения.
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '60')
+DB_CONN_MAX_AGE = int(DB_CONN_MAX_AGE) if DB_CONN_MAX_AGE else None
 
 DATABASES = {
     'default': {
@@ -69,10 +75,50 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'password'),
         'HOST': os.getenv('DB_HOST', 'host'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        # В режиме пулинга транзакций pgbouncer серверные курсоры
+        # не переживают транзакцию, поэтому они отключаются.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_PGBOUNCER', 'False') == 'True',
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30))
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', 100000))
+
+# Состояние пользователя (избранное, корзина, подписки) и кэш ответов
+# сбрасываются при изменениях только в том процессе, который их обработал,
+# если кэш не общий. При нескольких воркерах задайте CACHE_BACKEND для Redis
+# или Memcached либо отключите кэши: USER_STATE_CACHE_TIMEOUT=0 и
+# RESPONSE_CACHE_ENABLED=False.
+USER_STATE_CACHE_TIMEOUT = int(os.getenv('USER_STATE_CACHE_TIMEOUT', 5 * 60))
+# Выход пользователя сбрасывает кэш токена только в том процессе, который
+# его обработал, если кэш не общий. При нескольких воркерах задайте
+# CACHE_BACKEND для Redis или Memcached либо отключите кэш значением 0.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
+RESPONSE_CACHE_ENABLED = os.getenv(
+    'RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 10 * 60))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -93,7 +139,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKEND': ['djagno_filters.rest_framework.DjangoFilterBackend'],
     'SEARCH_PARAM': 'name',
@@ -123,6 +169,46 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/backend_media/media'
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 20))
+INGREDIENT_INDEX_ENABLED = os.getenv(
+    'INGREDIENT_INDEX_ENABLED', 'True') == 'True'
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 5 * 60))
+
+SHOPPING_LIST_CACHE_DIR = os.getenv('SHOPPING_LIST_CACHE_DIR')
+SHOPPING_LIST_CACHE_MAX_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_SIZE', 50 * 1024 * 1024))
+SHOPPING_LIST_CACHE_MAX_AGE = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_AGE', 60 * 60))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CSRF_TRUSTED_ORIGINS = os.getenv('TRUSTED_ORIGINS', '').split()
+
+QUERY_INSTRUMENTATION_ENABLED = os.getenv(
+    'QUERY_INSTRUMENTATION_ENABLED', 'False') == 'True'
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', 'False') == 'True'
+# Число запросов к базе на холодном кэше, включая аутентификацию.
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 6,
+    'RecipeViewSet.retrieve': 6,
+    'UserViewSet.subscriptions': 5,
+    'TagViewSet.list': 2,
+    'IngredientViewSet.list': 2,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -3,6 +3,9 @@ from django.contrib.auth.models import AbstractUser
 
 
 class User(AbstractUser):
+    # Поля, которые выводятся в ответах API вместе с рецептами автора.
+    PUBLIC_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
     first_name = models.CharField(
         verbose_name='имя пользователя',
         max_length=150,
@@ -16,12 +19,42 @@ class User(AbstractUser):
         max_length=254,
         blank=False,
         unique=True)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='количество рецептов',
+        default=0,
+        editable=False)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='количество подписчиков',
+        default=0,
+        editable=False)
 
     class Meta:
         verbose_name = 'пользователь'
         verbose_name_plural = 'пользователи'
         ordering = ['first_name']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_public_data = instance.get_public_data()
+        return instance
+
+    def get_public_data(self):
+        return {field: self.__dict__.get(field)
+                for field in self.PUBLIC_FIELDS}
+
+    def public_data_changed(self):
+        """
+        Изменились ли публичные поля с момента загрузки из базы.
+        Для объекта, созданного не из базы, всегда возвращает True.
+        """
+        return self.get_public_data() != getattr(
+            self, '_loaded_public_data', None)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_public_data = self.get_public_data()
+
     def __repr__(self):
         return f'{self.first_name} {self.last_name}'
 